@@ -0,0 +1,25 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-production-plan-snapshot")
+@pass_context
+def rebuild_production_plan_snapshot(context):
+	"""Rebuild the Production Plan Stock Snapshot from Bins and pending Purchase Orders."""
+	import frappe
+
+	from custom_reports.custom_stock_reports.utils.plan_snapshot import rebuild
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		count = rebuild()
+		frappe.db.commit()
+	finally:
+		frappe.destroy()
+
+	click.echo(f"Rebuilt the stock snapshot of {count} items on {site}")
+
+
+commands = [rebuild_production_plan_snapshot]
@@ -0,0 +1,9 @@
+# Copyright (c) 2026, Aits and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class ProductionPlanStockSnapshot(Document):
+	# rows are written in bulk by custom_stock_reports.utils.plan_snapshot, never through the form
+	pass
@@ -89,9 +89,273 @@ frappe.query_reports["Custom Production Planning Report"] = {
 			depends_on: "eval: doc.based_on != 'Work Order'",
 			default: 0,
 		},
+		{
+			fieldname: "explode_multi_level",
+			label: __("Multi-level BOM Explosion"),
+			fieldtype: "Check",
+			depends_on: "eval: doc.based_on != 'Work Order'",
+			default: 0,
+		},
+		{
+			fieldname: "net_subassembly_stock",
+			label: __("Net Sub-assembly Stock"),
+			fieldtype: "Check",
+			depends_on: "eval: doc.explode_multi_level",
+			default: 0,
+		},
+		{
+			fieldname: "limit_to_company",
+			label: __("Only Company Warehouses"),
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			fieldname: "warehouse_groups",
+			label: __("Warehouse Groups"),
+			fieldtype: "MultiSelectList",
+			options: "Warehouse",
+			get_data: function (txt) {
+				let company = frappe.query_report.get_filter_value("company");
+				return frappe.db.get_link_options("Warehouse", txt, { is_group: 1, company: company });
+			},
+		},
+		{
+			fieldname: "rollup_depth",
+			label: __("Rollup Depth"),
+			fieldtype: "Int",
+			description: __("Roll stock up to every group warehouse in the top N levels"),
+		},
+		{
+			fieldname: "rollup_warehouses",
+			label: __("Rollup Warehouses"),
+			fieldtype: "MultiSelectList",
+			options: "Warehouse",
+			get_data: function (txt) {
+				let company = frappe.query_report.get_filter_value("company");
+				return frappe.db.get_link_options("Warehouse", txt, { is_group: 1, company: company });
+			},
+		},
+		{
+			fieldname: "batch_allocation",
+			label: __("Batch Allocation"),
+			fieldtype: "Check",
+			depends_on: "eval: !doc.raw_material_warehouse",
+			default: 0,
+		},
+		{
+			fieldname: "aggregate_demand",
+			label: __("Aggregate Demand"),
+			fieldtype: "Check",
+			depends_on: "eval: doc.based_on != 'Work Order'",
+			default: 0,
+		},
+		{
+			fieldname: "demand_bucket",
+			label: __("Due Date Bucket"),
+			fieldtype: "Select",
+			options: ["Week", "Month"],
+			default: "Week",
+			depends_on: "eval: doc.aggregate_demand && doc.based_on != 'Work Order'",
+		},
+		{
+			fieldname: "concurrent_loading",
+			label: __("Concurrent Loading"),
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			fieldname: "sql_pipeline",
+			label: __("Single Query Loading"),
+			fieldtype: "Check",
+			depends_on: "eval: !doc.explode_multi_level",
+			default: 0,
+		},
+		{
+			fieldname: "use_stock_snapshot",
+			label: __("Use Stock Snapshot"),
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			fieldname: "incremental",
+			label: __("Incremental Re-planning"),
+			fieldtype: "Check",
+			depends_on: "eval: !doc.explode_multi_level",
+			default: 0,
+		},
+		{
+			fieldname: "shortage_only",
+			label: __("Only Shortages"),
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			fieldname: "sort_by",
+			label: __("Sort By"),
+			fieldtype: "Select",
+			options: ["", "Required Qty", "Balance Qty", "Raw Material Code", "Item Code", "Order"],
+		},
+		{
+			fieldname: "sort_order",
+			label: __("Sort Order"),
+			fieldtype: "Select",
+			options: ["Ascending", "Descending"],
+			default: "Ascending",
+			depends_on: "eval: doc.sort_by",
+		},
+		{
+			fieldname: "paginate",
+			label: __("Paginated Output"),
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			fieldname: "run_in_background",
+			label: __("Run in Background"),
+			fieldtype: "Check",
+			default: 0,
+			on_change: function () {
+				if (frappe.query_report.get_filter_value("run_in_background")) {
+					frappe.query_reports["Custom Production Planning Report"].enqueue_background_run();
+				} else {
+					frappe.query_report.refresh();
+				}
+			},
+		},
+		{
+			fieldname: "debug",
+			label: __("Show Run Statistics"),
+			fieldtype: "Check",
+			default: 0,
+		},
 	],
 
+	page_length: 500,
+
+	// Queue a background run for the current filters; the report run itself is read-only
+	enqueue_background_run: function () {
+		frappe.call({
+			method: "custom_reports.custom_stock_reports.utils.background_report.enqueue_report",
+			type: "POST",
+			args: { filters: frappe.query_report.get_filter_values() },
+			callback: function (r) {
+				frappe.show_alert(__("Report is being prepared in the background ({0}).", [r.message.name]));
+				frappe.query_report.refresh();
+			},
+		});
+	},
+
+	// Fetch a finished background run window by window, appending rows as they arrive
+	load_prepared_report: function (prepared_report, start) {
+		let me = this;
+		start = start || 0;
+
+		frappe.call({
+			method: "custom_reports.custom_stock_reports.utils.background_report.get_report_page",
+			args: { prepared_report: prepared_report, start: start, page_length: me.page_length },
+			callback: function (r) {
+				let page = r.message;
+				if (!page || page.status != "Completed") return;
+
+				let report = frappe.query_report;
+				if (!start) {
+					report.columns = report.prepare_columns(page.columns);
+					report.data = page.result;
+					report.render_datatable();
+				} else if (page.result.length) {
+					report.data = report.data.concat(page.result);
+					report.datatable.appendRows(page.result);
+				}
+
+				if (start + me.page_length < page.total) {
+					me.load_prepared_report(prepared_report, start + me.page_length);
+				}
+			},
+		});
+	},
+
+	// Append the next window of a paginated run; the plan itself stays on the server
+	load_plan_window: function () {
+		let me = this;
+		let report = frappe.query_report;
+		let start = (report.data || []).length;
+
+		frappe.call({
+			method: "custom_reports.custom_stock_reports.utils.plan_window.get_plan_window",
+			args: { filters: report.get_filter_values(), start: start, page_length: me.page_length },
+			callback: function (r) {
+				let page = r.message;
+				if (!page || !page.result.length) {
+					frappe.show_alert(__("All rows are loaded."));
+					return;
+				}
+
+				report.data = report.data.concat(page.result);
+				report.datatable.appendRows(page.result);
+				frappe.show_alert(__("Showing {0} of {1} rows.", [report.data.length, page.total]));
+			},
+		});
+	},
+
+	// Drill back from an aggregated demand line to the order lines it was built from;
+	// document names, items and warehouses are user input and are escaped in the dialog HTML
+	show_contributing_orders: function (data) {
+		let escape = frappe.utils.escape_html;
+		let based_on = frappe.query_report.get_filter_value("based_on");
+		let rows = (data.contributing_orders || [])
+			.map(
+				(d) => `<tr>
+					<td><a href="${escape(frappe.utils.get_form_link(based_on, d.name))}">${escape(d.name)}</a></td>
+					<td class="text-right">${format_number(d.qty)}</td>
+					<td>${d.due_date ? frappe.datetime.str_to_user(d.due_date) : ""}</td>
+				</tr>`
+			)
+			.join("");
+
+		frappe.msgprint({
+			title: __("Orders for {0} in {1}", [escape(data.production_item), escape(data.warehouse)]),
+			message: `<table class="table table-bordered table-condensed">
+				<thead><tr><th>${__(based_on)}</th><th>${__("Qty")}</th><th>${__("Due Date")}</th></tr></thead>
+				<tbody>${rows}</tbody>
+			</table>`,
+		});
+	},
+
 	onload: function (report) {
+  let me = this;
+  report.page.wrapper.on("click", ".plan-contributing-orders", function () {
+    let row_index = $(this).closest(".dt-cell").attr("data-row-index");
+    me.show_contributing_orders(frappe.query_report.datatable.datamanager.getData(row_index));
+  });
+  report.page.add_inner_button(__("Load More Rows"), function () {
+    if (!frappe.query_report.get_filter_value("paginate")) {
+      frappe.msgprint(__("Enable Paginated Output to load rows window by window."));
+      return;
+    }
+    me.load_plan_window();
+  });
+  report.page.add_inner_button(__("Prepare in Background"), function () {
+    if (frappe.query_report.get_filter_value("run_in_background")) {
+      me.enqueue_background_run();
+    } else {
+      // the filter's on_change queues the run
+      frappe.query_report.set_filter_value("run_in_background", 1);
+    }
+  });
+
+  frappe.realtime.off("production_plan_progress");
+  frappe.realtime.on("production_plan_progress", function (data) {
+    if (data.stage == "completed") {
+      frappe.hide_progress();
+      me.load_prepared_report(data.prepared_report);
+    } else if (data.stage == "error") {
+      frappe.hide_progress();
+      frappe.msgprint(__("Background report {0} failed.", [data.prepared_report]));
+    } else {
+      frappe.show_progress(__("Preparing Report"), data.progress, data.total, __(data.stage));
+    }
+  });
+
   report.page.add_inner_button(__('+ Create Material Request'), function () {
     // get current filters but don’t force/require docnames
     let filters = frappe.query_report.get_filter_values() || {};
@@ -145,6 +409,10 @@ frappe.query_reports["Custom Production Planning Report"] = {
 			value = "";
 		}
 
+		if (column.fieldname == "order_count" && data && data.contributing_orders) {
+			value = `<a class="plan-contributing-orders">${value}</a>`;
+		}
+
 		if (column.fieldname == "raw_material_name" && data && data.required_qty > data.allotted_qty) {
 			value = `<div style="color:red">${value}</div>`;
 		}
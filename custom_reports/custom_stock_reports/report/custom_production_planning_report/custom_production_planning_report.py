@@ -4,78 +4,310 @@
 import frappe
 from frappe import _
 from pypika import Order
-from erpnext.stock.doctype.warehouse.warehouse import get_child_warehouses
 from collections import defaultdict
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import cint, flt
+
+from custom_reports.custom_stock_reports.utils import (
+	aggregated_demand,
+	bulk_lookup,
+	plan_window,
+	report_cache,
+	sql_pipeline,
+)
+from custom_reports.custom_stock_reports.utils.allocation import BatchAllocator
+from custom_reports.custom_stock_reports.utils.bom_explosion import BOMExplosion
+from custom_reports.custom_stock_reports.utils.concurrent_loader import run_concurrently
+from custom_reports.custom_stock_reports.utils.incremental_plan import IncrementalPlanner
+from custom_reports.custom_stock_reports.utils.instrumentation import StageInstrumentation
+from custom_reports.custom_stock_reports.utils.plan_snapshot import SNAPSHOT_DOCTYPE, get_snapshot
+from custom_reports.custom_stock_reports.utils.warehouse_tree import get_warehouse_tree
 
 def execute(filters=None):
-	return ProductionPlanReport(filters).execute_report()
+	filters = frappe._dict(filters or {})
+
+	if cint(filters.get("debug")):
+		# always run in the request, and show per-stage statistics as the report message
+		report = ProductionPlanReport(filters)
+		columns, data = report.execute_report()
+		return columns, data, report.instrumentation.get_message()
+
+	if filters.get("run_in_background"):
+		# runs are queued by the report JS, this request is read-only
+		from custom_reports.custom_stock_reports.utils.background_report import get_background_result
+
+		return get_background_result(filters)
+
+	if plan_window.has_view(filters):
+		return plan_window.execute(filters)
+
+	result = report_cache.get_cached_result(filters)
+	if result is not None:
+		return result
+
+	result = ProductionPlanReport(filters).execute_report()
+	report_cache.set_cached_result(filters, result)
+	return result
+
+class PlanRow:
+	"""
+	Compact report row kept while planning. Instead of copying the order header, Bin record
+	and every parent-warehouse column into a dict per row, it holds references plus the few
+	values that change during allocation. as_dict() builds the display row on demand.
+	"""
+
+	__slots__ = ("bin", "bin_qty", "fields", "header", "item_code", "purchase")
+
+	def __init__(self, item_code, fields, header=None, bin=None, purchase=None):
+		self.item_code = item_code
+		self.fields = fields  # raw material fields as they were when the row was emitted
+		self.header = header  # order dict, shared by all rows of the order (first row only)
+		self.bin = bin
+		# Bin actual_qty is consumed as allocation goes on, keep the value the row saw
+		self.bin_qty = bin.get("actual_qty") if bin else None
+		self.purchase = purchase
+
+	def as_dict(self, report):
+		row = report.get_args()
+		if self.bin:
+			# copy bin fields (actual_qty, ordered_qty, projected_qty)
+			row.update(self.bin)
+			row["actual_qty"] = self.bin_qty
+		if self.header:
+			row.update(self.header)
+		row.update(self.fields)
+		# merge any purchase-details (arrival_date, arrival_qty for this warehouse)
+		if self.purchase:
+			row.update(self.purchase)
+
+		# add parent warehouse columns, POQty and balance
+		report._enrich_row_parent_po_fields(row, self.item_code)
+		return row
+
 
 class ProductionPlanReport:
-	def __init__(self, filters=None):
+	# (stage, methods) in execution order; stage names are reported to progress_callback
+	STAGES = (
+		("orders", ("get_open_orders",)),
+		("raw_materials", ("get_raw_materials", "get_item_details")),
+		("bins", ("get_bin_details",)),
+		("purchase_orders", ("get_purchase_details",)),
+		("warehouses", ("get_parent_warehouses", "build_parent_warehouse_data")),
+		("prepare_data", ("prepare_data", "get_columns")),
+	)
+	# with the concurrent_loading filter the queries of the "stock" stage run at the same time
+	CONCURRENT_STAGES = (
+		("orders", ("get_open_orders",)),
+		("raw_materials", ("get_raw_materials",)),
+		("stock", ("load_concurrently",)),
+		("warehouses", ("get_parent_warehouses", "build_parent_warehouse_data")),
+		("prepare_data", ("prepare_data", "get_columns")),
+	)
+	# with the sql_pipeline filter everything the orders lead to is loaded by one set-based query
+	PIPELINE_STAGES = (
+		("orders", ("get_open_orders",)),
+		("pipeline", ("load_pipeline",)),
+		("warehouses", ("get_parent_warehouses", "build_parent_warehouse_data")),
+		("prepare_data", ("prepare_data", "get_columns")),
+	)
+	# set to False to never write Production Plan Run Logs (e.g. from the benchmark harness)
+	log_runs = True
+
+	def __init__(self, filters=None, progress_callback=None):
 		self.filters = frappe._dict(filters or {})
+		# optional callable(stage, index, total), e.g. realtime updates from a background job
+		self.progress_callback = progress_callback
 		self.raw_materials_dict = {}
+		# compact PlanRow records built by the allocation; self.data holds the materialized dicts
+		self.rows = []
 		self.data = []
 		self.parent_qty_map = {}
+		# per-item stock across all bins; only set by the multi-level rollup, where
+		# a bin counts towards several parent columns and their sum would overstate stock
+		self.item_stock_totals = None
+		# set of warehouses Bin / Warehouse loads are limited to, None when unscoped
+		self.warehouse_scope = None
+		# multi-level explosion engine, only with the explode_multi_level filter
+		self.bom_explosion = None
+		# batched allocation, only with the batch_allocation filter (see prepare_data)
+		self.allocator = None
+		self.warehouses = []
+		self.item_codes = []
+		self.purchase_details = {}
+		self.purchase_index = {}
+		self.po_qty_map = {}
+		# (parent_wh, fieldname) of the parent-warehouse columns and the per-item row enrichment,
+		# both built from the final parent warehouses / PO maps, see get_columns
+		self.parent_fieldnames = None
+		self._item_enrichment = {}
+		# rollup stock rows fetched ahead by load_concurrently
+		self.rollup_rows = None
+		# pending PO lines and per-parent Bin totals read together with the bins from the stock
+		# snapshot (use_stock_snapshot)
+		self.snapshot_purchases = None
+		self.snapshot_parent_qty_map = None
+		# set by get_shortages: allocation only accumulates per-item shortages, no display rows
+		self.collect_shortages = False
+		self.shortages = {}
+		# per-order allocation log, only kept for incremental re-planning (see IncrementalPlanner)
+		self.order_logs = None
+		self._order_log = None
+		# per-stage time / queries / rows; memory is only traced with the debug filter
+		self.instrumentation = StageInstrumentation(trace_memory=bool(cint(self.filters.debug)))
 
 	def execute_report(self):
-		self.bin_details = {}
-		self.get_open_orders()
-		self.get_raw_materials()
-		self.get_item_details()
-		self.get_bin_details()
-		self.get_purchase_details()
-		self.get_po_qty_map()
-		# remove: self.get_parent_warehouse_qty_map()
-		self.get_parent_warehouses()   # keeps your old naming but build_parent_warehouse_data below will set parent_warehouses properly
-		self.build_parent_warehouse_data()
-		self.prepare_data()
-		self.get_columns()
+		with self.instrumentation.track():
+			if cint(self.filters.incremental):
+				IncrementalPlanner(self).run()
+			else:
+				self.run_stages()
+			self.instrumentation.start("materialize")
+			self.data = list(self.iter_data())
 
+		if self.log_runs:
+			self.instrumentation.log(self.filters, len(self.data), force=cint(self.filters.debug))
 		return self.columns, self.data
 
+	def iter_data(self, start=0, stop=None):
+		"""Materialize display rows lazily, optionally only a window of them."""
+		for row in self.rows[start:stop]:
+			yield row.as_dict(self)
+
+	def get_shortages(self):
+		"""
+		Lean run for the Material Request mapper. Loads data and allocates stock exactly
+		like execute_report, but skips display rows and columns and returns
+		{ item_code: { qty, warehouse, rows }, ... } for rows with a positive balance.
+		"""
+		self.collect_shortages = True
+		self.shortages = {}
+		with self.instrumentation.track():
+			self.run_stages(skip=("get_columns",))
+
+		if self.log_runs:
+			self.instrumentation.log(self.filters, len(self.shortages), force=cint(self.filters.debug))
+		return self.shortages
+
+	def run_stages(self, skip=()):
+		self.bin_details = {}
+		# Warehouse nested set, loaded once per cache generation and shared by every stage
+		self.warehouse_tree = self.get_warehouse_tree()
+		if self.use_sql_pipeline():
+			stages = self.PIPELINE_STAGES
+		elif cint(self.filters.concurrent_loading):
+			stages = self.CONCURRENT_STAGES
+		else:
+			stages = self.STAGES
+		total = len(stages)
+		for index, (stage, methods) in enumerate(stages):
+			if self.progress_callback:
+				self.progress_callback(stage, index, total)
+			self.instrumentation.start(stage)
+			for method in methods:
+				if method not in skip:
+					getattr(self, method)()
+
+	def get_warehouse_tree(self):
+		return get_warehouse_tree()
+
 	# helper to add parent-warehouse + PO fields to a row
 	def _enrich_row_parent_po_fields(self, row, item_code):
 		"""
-		Fill parent-warehouse qty columns, arrival_qty (POQty) and balance_po_qty
-		- Uses self.parent_warehouses (list of parent warehouse names)
-		- Uses self.parent_qty_map which is: { parent_wh: { item_code: qty, ... }, ... }
-		- Uses self.po_qty_map which is: { item_code: po_pending_qty, ... }
-		- Uses self.purchase_details which is keyed by (item_code, warehouse)
+		Fill parent-warehouse qty columns, arrival_qty (POQty), balance_po_qty and arrival_date.
+		Everything but the balance only depends on the item, see _get_item_enrichment.
 		"""
-		# ensure required_qty is numeric
-		required_qty = flt(row.get("required_qty") or 0.0)
+		enrichment = self._item_enrichment.get(item_code) or self._get_item_enrichment(item_code)
+		row.update(enrichment.fields)
+
+		# balance = required - sum(parent qtys) - po_qty
+		row["balance_po_qty"] = flt(row.get("required_qty") or 0.0) - enrichment.covered_qty
+
+		if enrichment.arrival_date:
+			row["arrival_date"] = enrichment.arrival_date
 
+	def _get_item_enrichment(self, item_code):
+		"""
+		Per-run memo of the item's enrichment, shared by every row of the item:
+		{ fields: { parent column fieldname: qty, ..., arrival_qty: po_qty }, covered_qty, arrival_date }
+		- parent quantities come from self.parent_qty_map: { parent_wh: { item_code: qty, ... }, ... }
+		- po_qty from self.po_qty_map, the earliest arrival_date from self.purchase_index
+		"""
+		fields = {}
 		total_parent_qty = 0.0
-		for parent_wh in getattr(self, "parent_warehouses", []):
-			# parent_qty_map stores parent -> { item_code: qty }
-			parent_map = self.parent_qty_map.get(parent_wh, {})
-			qty = flt(parent_map.get(item_code, 0.0))
-			row[frappe.scrub(f"{parent_wh}_qty")] = qty
+		for parent_wh, fieldname in self.get_parent_fieldnames():
+			qty = flt(self.parent_qty_map.get(parent_wh, {}).get(item_code, 0.0))
+			fields[fieldname] = qty
 			total_parent_qty += qty
 
+		if self.item_stock_totals is not None:
+			total_parent_qty = flt(self.item_stock_totals.get(item_code, 0.0))
+
 		# POQty (arrival_qty) from precomputed map
-		po_qty = flt(getattr(self, "po_qty_map", {}).get(item_code, 0.0))
-		row["arrival_qty"] = po_qty
+		po_qty = flt(self.po_qty_map.get(item_code, 0.0))
+		fields["arrival_qty"] = po_qty
+
+		purchase = self.purchase_index.get(item_code)
+		enrichment = self._item_enrichment[item_code] = frappe._dict(
+			fields=fields,
+			covered_qty=total_parent_qty + po_qty,
+			arrival_date=purchase.arrival_date if purchase else None,
+		)
+		return enrichment
 
-		# balance = required - sum(parent qtys) - po_qty
-		row["balance_po_qty"] = required_qty - total_parent_qty - po_qty
+	def get_parent_fieldnames(self):
+		"""[ (parent_wh, column fieldname), ... ], compiled once per run (see get_columns)."""
+		if self.parent_fieldnames is None:
+			self.parent_fieldnames = [
+				(parent_wh, frappe.scrub(f"{parent_wh}_qty")) for parent_wh in getattr(self, "parent_warehouses", [])
+			]
+		return self.parent_fieldnames
 
-		# earliest arrival_date (if purchase_details has arrival_date entries)
-		arrival_dates = []
-		for (it, wh), pd in getattr(self, "purchase_details", {}).items():
-			if it == item_code and getattr(pd, "arrival_date", None):
-				arrival_dates.append(pd.arrival_date)
+	def _add_shortage(self, item_code, required_qty, warehouse):
+		"""
+		Same balance and warehouse choice the mapper used to derive from display rows:
+		balance = required - sum(parent qtys) - po_qty, and the parent warehouse with the
+		highest positive qty wins, falling back to the row warehouse.
+		"""
+		stock = self.item_stock_summary.get(item_code) or frappe._dict(total=0.0, warehouse=None, qty=-1.0)
+		balance = flt(required_qty) - stock.total - flt(self.po_qty_map.get(item_code, 0.0))
+		if balance <= 0:
+			return
+
+		entry = self.shortages.get(item_code)
+		if not entry:
+			entry = self.shortages[item_code] = frappe._dict(qty=0.0, warehouse=None, score=None, rows=0)
+		entry.qty += balance
+		entry.rows += 1
+
+		picked_wh, picked_score = (stock.warehouse, stock.qty) if stock.warehouse else (warehouse, -1.0)
+		if picked_wh and (entry.score is None or picked_score > entry.score):
+			entry.warehouse, entry.score = picked_wh, picked_score
 
-		if arrival_dates:
-			# pick earliest
-			row["arrival_date"] = min(arrival_dates)
+	def build_item_stock_summary(self):
+		"""
+		Per-item view of self.parent_qty_map used by get_shortages:
+		{ item_code: { total: sum of parent qtys, warehouse: parent with highest positive qty, qty }, ... }
+		"""
+		self.item_stock_summary = {}
+		for parent_wh in self.parent_warehouses:
+			for item_code, qty in self.parent_qty_map.get(parent_wh, {}).items():
+				stock = self.item_stock_summary.get(item_code)
+				if not stock:
+					stock = self.item_stock_summary[item_code] = frappe._dict(total=0.0, warehouse=None, qty=-1.0)
+
+				qty = flt(qty)
+				stock.total += qty
+				if qty > 0 and qty > stock.qty:
+					stock.warehouse, stock.qty = parent_wh, qty
+
+		if self.item_stock_totals is not None:
+			for item_code, stock in self.item_stock_summary.items():
+				stock.total = flt(self.item_stock_totals.get(item_code, 0.0))
 
 	def get_parent_warehouses(self):
 		self.parent_warehouses = set()
 		for warehouse in self.warehouses:
-			parent_warehouse = frappe.get_cached_value("Warehouse", warehouse, "parent_warehouse") or warehouse
+			parent_warehouse = self.warehouse_tree.parent(warehouse) or warehouse
 			self.parent_warehouses.add(parent_warehouse)
 		self.parent_warehouses = sorted(filter(None, self.parent_warehouses))
 
@@ -105,40 +337,14 @@ class ProductionPlanReport:
 
 	# 	self.parent_qty_map = qty_map
 
-	def get_po_qty_map(self):
-		# """
-		# Build a mapping of item_code -> total PO qty based on Purchase Orders.
-		# Uses filters if provided (company, from_date, to_date).
-		# """
-		# base condition: only submitted POs
-		conditions = ["po.docstatus = 1"]
-		params = {}
-		if self.filters.get("company"):
-			conditions.append("po.company = %(company)s")
-			params["company"] = self.filters.get("company")
-		# use transaction_date from Purchase Order (adjust field if you want creation_date)
-		if self.filters.get("from_date"):
-			conditions.append("po.transaction_date >= %(from_date)s")
-			params["from_date"] = self.filters.get("from_date")
-
-		if self.filters.get("to_date"):
-			conditions.append("po.transaction_date <= %(to_date)s")
-			params["to_date"] = self.filters.get("to_date")
+	def get_open_orders(self):
+		self.orders = self.query_open_orders(self.filters.docnames)
 
-		cond_sql = " AND ".join(conditions)
-		sql = f"""
-			SELECT poi.item_code AS item_code, SUM(poi.qty - poi.received_qty) AS po_qty
-			FROM `tabPurchase Order Item` poi
-			JOIN `tabPurchase Order` po ON po.name = poi.parent
-			WHERE {cond_sql}
-			GROUP BY poi.item_code
-		"""
-		rows = frappe.db.sql(sql, params, as_dict=True)
-		# store as simple dict for quick lookup
-		self.po_qty_map = {r.item_code: (r.po_qty or 0) for r in rows}
-		#frappe.msgprint(f"PO map sample: {dict(list(self.po_qty_map.items())[:10])}")
+	def query_open_orders(self, docnames=None):
+		return self.build_open_orders_query(docnames).run(as_dict=True)
 
-	def get_open_orders(self):
+	def build_open_orders_query(self, docnames=None):
+		"""Open orders of based_on in order_by priority; also the orders CTE of the SQL pipeline."""
 		doctype, order_by = self.filters.based_on, self.filters.order_by
 
 		parent = frappe.qb.DocType(doctype)
@@ -161,8 +367,8 @@ class ProductionPlanReport:
 
 			if order_by == "Planned Start Date":
 				query = query.orderby(parent.planned_start_date, order=Order.asc)
-			if self.filters.docnames:
-				query = query.where(parent.name.isin(self.filters.docnames))
+			if docnames:
+				query = query.where(parent.name.isin(docnames))
 		else:
 			child = frappe.qb.DocType(f"{doctype} Item")
 			query = (
@@ -179,8 +385,8 @@ class ProductionPlanReport:
 				)
 				.where(parent.name == child.parent)
 			)
-			if self.filters.docnames:
-				query = query.where(child.parent.isin(self.filters.docnames))
+			if docnames:
+				query = query.where(child.parent.isin(docnames))
 
 			if doctype == "Sales Order":
 				query = query.select(
@@ -213,7 +419,7 @@ class ProductionPlanReport:
 		if self.filters.company:
 			query = query.where(parent.company == self.filters.company)
 
-		self.orders = query.run(as_dict=True)
+		return query
 
 	def get_raw_materials(self):
 		if not self.orders:
@@ -222,44 +428,73 @@ class ProductionPlanReport:
 		self.item_codes = [d.production_item for d in self.orders]
 
 		if self.filters.based_on == "Work Order":
-			work_orders = [d.name for d in self.orders]
-			raw_materials = (
-				frappe.get_all(
-					"Work Order Item",
-					fields=[
-						"parent",
-						"item_code",
-						"item_name as raw_material_name",
-						"source_warehouse as warehouse",
-						"required_qty",
-					],
-					filters={"docstatus": 1, "parent": ("in", work_orders), "source_warehouse": ("!=", "")},
-				)
-				or []
-			)
+			raw_materials = self.get_work_order_items([d.name for d in self.orders])
 			self.warehouses.extend([d.source_warehouse for d in raw_materials])
 		else:
-			bom_nos = []
+			self.resolve_default_boms(self.orders)
+			bom_nos = list(dict.fromkeys(d.bom_no for d in self.orders if d.bom_no))
 
-			for d in self.orders:
-				bom_no = d.bom_no or frappe.get_cached_value("Item", d.production_item, "default_bom")
+			if cint(self.filters.explode_multi_level):
+				raw_materials = self.get_multi_level_raw_materials(bom_nos)
+			else:
+				raw_materials = self.get_bom_items(bom_nos)
 
-				if not d.bom_no:
-					d.bom_no = bom_no
+		if not raw_materials:
+			return
 
-				bom_nos.append(bom_no)
-			bom_item_doctype = (
-				"BOM Explosion Item" if self.filters.include_subassembly_raw_materials else "BOM Item"
-			)
+		self.add_raw_materials(raw_materials)
 
-			bom = frappe.qb.DocType("BOM")
-			bom_item = frappe.qb.DocType(bom_item_doctype)
-			if self.filters.include_subassembly_raw_materials:
-				qty_field = bom_item.qty_consumed_per_unit
-			else:
-				qty_field = bom_item.qty / bom.quantity
+	def add_raw_materials(self, raw_materials):
+		self.item_codes.extend([d.item_code for d in raw_materials])
+		for d in raw_materials:
+			if d.parent not in self.raw_materials_dict:
+				self.raw_materials_dict.setdefault(d.parent, [])
+
+			rows = self.raw_materials_dict[d.parent]
+			rows.append(d)
+
+	def get_work_order_items(self, work_orders):
+		return bulk_lookup.get_all_in(
+			"Work Order Item",
+			"parent",
+			work_orders,
+			fields=[
+				"parent",
+				"item_code",
+				"item_name as raw_material_name",
+				"source_warehouse as warehouse",
+				"required_qty",
+			],
+			filters={"docstatus": 1, "source_warehouse": ("!=", "")},
+		)
 
-			raw_materials = (
+	def resolve_default_boms(self, orders):
+		"""Fill missing bom_no from Item.default_bom for all distinct items in one query."""
+		items_without_bom = list({d.production_item for d in orders if not d.bom_no})
+		if not items_without_bom:
+			return
+
+		default_boms = dict(
+			bulk_lookup.get_all_in("Item", "name", items_without_bom, fields=["name", "default_bom"], as_list=True)
+		)
+		for d in orders:
+			if not d.bom_no:
+				d.bom_no = default_boms.get(d.production_item)
+
+	def get_bom_items(self, bom_nos):
+		bom_item_doctype = (
+			"BOM Explosion Item" if self.filters.include_subassembly_raw_materials else "BOM Item"
+		)
+
+		bom = frappe.qb.DocType("BOM")
+		bom_item = frappe.qb.DocType(bom_item_doctype)
+		if self.filters.include_subassembly_raw_materials:
+			qty_field = bom_item.qty_consumed_per_unit
+		else:
+			qty_field = bom_item.qty / bom.quantity
+
+		return bulk_lookup.run_in(
+			lambda chunk: (
 				frappe.qb.from_(bom)
 				.from_(bom_item)
 				.select(
@@ -268,34 +503,128 @@ class ProductionPlanReport:
 					bom_item.item_name.as_("raw_material_name"),
 					qty_field.as_("required_qty_per_unit"),
 				)
-				.where((bom_item.parent.isin(bom_nos)) & (bom_item.parent == bom.name) & (bom.docstatus == 1))
-			).run(as_dict=True)
+				.where((bom_item.parent.isin(chunk)) & (bom_item.parent == bom.name) & (bom.docstatus == 1))
+			),
+			bom_nos,
+			as_dict=True,
+		)
 
-		if not raw_materials:
-			return
+	def get_multi_level_raw_materials(self, bom_nos):
+		"""
+		Leaf raw materials of every BOM through all sub-assembly levels, one row per item
+		with its per-unit qty. With net_subassembly_stock, update_raw_materials replaces these
+		per-unit figures with an order-by-order explosion that consumes sub-assembly stock.
+		"""
+		self.bom_explosion = self.get_bom_explosion(bom_nos)
+
+		raw_materials = []
+		for bom_no in dict.fromkeys(filter(None, bom_nos)):
+			for item_code, qty in self.bom_explosion.per_unit(bom_no).items():
+				raw_materials.append(
+					frappe._dict(
+						parent=bom_no,
+						item_code=item_code,
+						raw_material_name=self.bom_explosion.item_names.get(item_code),
+						required_qty_per_unit=qty,
+					)
+				)
 
-		self.item_codes.extend([d.item_code for d in raw_materials])
-		for d in raw_materials:
-			if d.parent not in self.raw_materials_dict:
-				self.raw_materials_dict.setdefault(d.parent, [])
+		return raw_materials
 
-			rows = self.raw_materials_dict[d.parent]
-			rows.append(d)
+	def get_bom_explosion(self, bom_nos):
+		return BOMExplosion(bom_nos)
 
 	def get_item_details(self):
 		if not (self.orders and self.item_codes):
 			return
 		self.item_details = {}
-		for d in frappe.get_all(
+		self.load_item_details(self.item_codes)
+
+	def load_item_details(self, item_codes):
+		for d in bulk_lookup.get_all_in(
 			"Item Default",
+			"parent",
+			item_codes,
 			fields=["parent", "default_warehouse"],
-			filters={"company": self.filters.company, "parent": ("in", self.item_codes)},
+			filters={"company": self.filters.company},
 		):
 			self.item_details[d.parent] = d
 
-	def get_bin_details(self):
+	def load_concurrently(self):
+		"""
+		Concurrent counterpart of get_item_details, get_bin_details, get_purchase_details and the
+		rollup stock query. They only depend on self.item_codes and the warehouse scope, so their
+		queries run at the same time on separate connections and are joined here, before the
+		results are processed exactly like in the sequential stages.
+		"""
+		if not (self.orders and self.raw_materials_dict):
+			return
+
+		self.warehouse_scope = self.get_warehouse_scope()
+		self.item_details = {}
+		tasks = {"item_details": (self.load_item_details, (self.item_codes,))}
+		# the snapshot serves bins and pending POs in one query, run by get_bin_details below
+		if not self.use_stock_snapshot():
+			tasks["bins"] = (self.load_bins, (self.item_codes,))
+			tasks["purchases"] = (self.load_purchase_details, (self.item_codes,))
+		if cint(self.filters.rollup_depth) or self.filters.rollup_warehouses:
+			tasks["rollup"] = (self.query_rollup_stock, (self.get_rollup_targets(),))
+
+		results = self.run_loaders(tasks)
+
+		self.get_bin_details(bins=results.get("bins"))
+		self.get_purchase_details(purchased_items=results.get("purchases"))
+		self.rollup_rows = results.get("rollup")
+
+	def run_loaders(self, tasks):
+		return run_concurrently(tasks, self.instrumentation)
+
+	def use_sql_pipeline(self):
+		"""
+		Load through sql_pipeline instead of the per-table stages. The multi-level explosion walks
+		BOMs level by level in Python and the stock snapshot is a single lookup already, both keep
+		the regular stages.
+		"""
+		return bool(
+			cint(self.filters.sql_pipeline)
+			and not cint(self.filters.explode_multi_level)
+			and not self.use_stock_snapshot()
+		)
+
+	def load_pipeline(self):
 		"""
-		Fetch Bin records for all item_codes involved (no warehouse restriction).
+		Pipeline counterpart of get_raw_materials, get_item_details, get_bin_details and
+		get_purchase_details: the rows of sql_pipeline.load are processed exactly like theirs.
+		"""
+		if not self.orders:
+			return
+
+		self.warehouse_scope = self.get_warehouse_scope()
+		loaded = self.query_pipeline()
+
+		self.warehouses = [d.warehouse for d in self.orders]
+		self.item_codes = [d.production_item for d in self.orders]
+		for d in self.orders:
+			if not d.bom_no:
+				d.bom_no = loaded["default_boms"].get(d.production_item)
+
+		raw_materials = loaded["raw_materials"]
+		if self.filters.based_on == "Work Order":
+			self.warehouses.extend([d.source_warehouse for d in raw_materials])
+		if raw_materials:
+			self.add_raw_materials(raw_materials)
+
+		self.item_details = {d.parent: d for d in loaded["item_details"]}
+		self.get_bin_details(bins=loaded["bins"])
+		self.get_purchase_details(purchased_items=loaded["purchases"])
+
+	def query_pipeline(self):
+		return sql_pipeline.load(self)
+
+	def get_bin_details(self, bins=None):
+		"""
+		Fetch Bin records for all item_codes involved (no warehouse restriction
+		unless a warehouse scope is set, see get_warehouse_scope).
 		Populate self.bin_details keyed as (item_code, warehouse) and ensure
 		self.warehouses includes all warehouses discovered.
 		"""
@@ -308,15 +637,15 @@ class ProductionPlanReport:
 
 		# Keep backwards behaviour for MRP filter if provided
 		if self.filters.raw_material_warehouse:
-			self.mrp_warehouses.extend(get_child_warehouses(self.filters.raw_material_warehouse))
+			self.mrp_warehouses.extend(self.warehouse_tree.child_warehouses(self.filters.raw_material_warehouse))
 			self.warehouses.extend(self.mrp_warehouses)
 
-		# Fetch all bins for the item_codes (no warehouse restriction)
-		bins = frappe.get_all(
-			"Bin",
-			fields=["warehouse", "item_code", "actual_qty", "ordered_qty", "projected_qty"],
-			filters={"item_code": ("in", self.item_codes)},
-		)
+		# Fetch all bins for the item_codes (restricted only by the optional warehouse scope)
+		self.warehouse_scope = self.get_warehouse_scope()
+		if bins is None and self.use_stock_snapshot():
+			bins, self.snapshot_purchases, self.snapshot_parent_qty_map = self.load_snapshot()
+		elif bins is None:
+			bins = self.load_bins(self.item_codes)
 
 		found_whs = set()
 		for d in bins:
@@ -328,26 +657,143 @@ class ProductionPlanReport:
 		# Merge discovered warehouses into self.warehouses
 		self.warehouses = list(set(self.warehouses or []) | found_whs)
 
+		# sub-assembly stock to net during the multi-level explosion
+		if self.bom_explosion and cint(self.filters.net_subassembly_stock):
+			self.bom_explosion.load_stock(self.warehouse_scope)
+
 		#frappe.msgprint(f"bins found for items: {len(bins)}; warehouses discovered: {len(found_whs)}")
 
-	def get_purchase_details(self):
-			if not (self.orders and self.raw_materials_dict):
-				return
-			self.purchase_details = {}
-			purchased_items = frappe.get_all(
-				"Purchase Order Item",
-				fields=["item_code", "min(schedule_date) as arrival_date", "sum(qty - received_qty) as arrival_qty", "warehouse"],
-				filters={
-					"item_code": ("in", self.item_codes),
-					"warehouse": ("in", self.warehouses),
-					"docstatus": 1,
-				},
-				group_by="item_code, warehouse",
-			)
-			for d in purchased_items:
-				key = (d.item_code, d.warehouse)
-				if key not in self.purchase_details:
-					self.purchase_details.setdefault(key, d)
+	def use_stock_snapshot(self):
+		"""
+		Read bins and pending POs from the Production Plan Stock Snapshot instead of tabBin and
+		the Purchase Order aggregation. The snapshot keeps pending quantities per company only,
+		so runs limiting Purchase Orders by from_date / to_date always aggregate them live.
+		"""
+		return bool(
+			cint(self.filters.use_stock_snapshot) and not (self.filters.get("from_date") or self.filters.get("to_date"))
+		)
+
+	def load_snapshot(self):
+		return get_snapshot(self.item_codes, self.warehouse_scope, self.filters.company)
+
+	def load_bins(self, item_codes, modified_after=None):
+		# item codes grow with the order book and are chunked; the scope is bounded by the Warehouse table
+		bin_filters = {}
+		if self.warehouse_scope is not None:
+			bin_filters["warehouse"] = ("in", sorted(self.warehouse_scope))
+		if modified_after:
+			bin_filters["modified"] = (">", modified_after)
+
+		return bulk_lookup.get_all_in(
+			"Bin",
+			"item_code",
+			item_codes,
+			fields=["warehouse", "item_code", "actual_qty", "ordered_qty", "projected_qty"],
+			filters=bin_filters,
+		)
+
+	def get_warehouse_scope(self):
+		"""
+		Warehouses to load stock from when scoping is on:
+		- limit_to_company: warehouses of the filtered company
+		- warehouse_groups: the selected groups and everything below them
+		Both together give the intersection; neither returns None (all warehouses).
+		"""
+		scope = None
+		if self.filters.warehouse_groups:
+			scope = set()
+			for group in frappe.parse_json(self.filters.warehouse_groups):
+				scope.update(self.warehouse_tree.child_warehouses(group))
+
+		if cint(self.filters.limit_to_company) and self.filters.company:
+			company_warehouses = {
+				d.name for d in self.warehouse_tree.warehouses if d.company == self.filters.company
+			}
+			scope = company_warehouses if scope is None else scope & company_warehouses
+
+		return scope
+
+	def _drop_empty_parent_columns(self):
+		"""Scoped runs only show parent warehouses holding non-zero stock of a selected item."""
+		self.parent_warehouses = [
+			wh for wh in self.parent_warehouses if any(flt(qty) for qty in self.parent_qty_map.get(wh, {}).values())
+		]
+		self.parent_qty_map = {wh: self.parent_qty_map[wh] for wh in self.parent_warehouses}
+
+	def get_purchase_details(self, purchased_items=None):
+		"""
+		One pending-PO aggregation for the items in this run, from open submitted Purchase Orders
+		(optionally limited by company and from_date / to_date on transaction_date).
+		Fills self.purchase_details keyed by (item_code, warehouse) with arrival_date (earliest
+		schedule_date) and arrival_qty, then derives the per-item index and self.po_qty_map from it.
+		"""
+		if not (self.orders and self.raw_materials_dict):
+			return
+
+		if purchased_items is None and self.snapshot_purchases is not None:
+			purchased_items = self.snapshot_purchases
+		elif purchased_items is None:
+			purchased_items = self.load_purchase_details(self.item_codes)
+
+		self.purchase_details = {}
+		for d in purchased_items:
+			self.purchase_details[(d.item_code, d.warehouse)] = d
+
+		self.build_purchase_index()
+
+	def load_purchase_details(self, item_codes):
+		conditions = [
+			"po.docstatus = 1",
+			"po.status NOT IN ('Closed', 'Completed')",
+			"poi.qty > poi.received_qty",
+			"poi.item_code IN %(item_codes)s",
+		]
+		params = {}
+		if self.filters.get("company"):
+			conditions.append("po.company = %(company)s")
+			params["company"] = self.filters.get("company")
+		# use transaction_date from Purchase Order (adjust field if you want creation_date)
+		if self.filters.get("from_date"):
+			conditions.append("po.transaction_date >= %(from_date)s")
+			params["from_date"] = self.filters.get("from_date")
+
+		if self.filters.get("to_date"):
+			conditions.append("po.transaction_date <= %(to_date)s")
+			params["to_date"] = self.filters.get("to_date")
+
+		cond_sql = " AND ".join(conditions)
+		return bulk_lookup.sql_in(
+			f"""
+			SELECT poi.item_code, poi.warehouse,
+				MIN(poi.schedule_date) AS arrival_date, SUM(poi.qty - poi.received_qty) AS arrival_qty
+			FROM `tabPurchase Order Item` poi
+			JOIN `tabPurchase Order` po ON po.name = poi.parent
+			WHERE {cond_sql}
+			GROUP BY poi.item_code, poi.warehouse
+			""",
+			item_codes,
+			params,
+			param="item_codes",
+			as_dict=True,
+		)
+
+	def build_purchase_index(self):
+		"""
+		Index self.purchase_details by item_code so row enrichment is a single lookup:
+		{ item_code: { arrival_date: earliest date, warehouse_qty: { warehouse: pending qty } }, ... }
+		and self.po_qty_map: { item_code: total pending qty }
+		"""
+		self.purchase_index = {}
+		self.po_qty_map = {}
+		for (item_code, warehouse), d in self.purchase_details.items():
+			entry = self.purchase_index.get(item_code)
+			if not entry:
+				entry = self.purchase_index[item_code] = frappe._dict(arrival_date=None, warehouse_qty={})
+
+			entry.warehouse_qty[warehouse] = flt(d.arrival_qty)
+			self.po_qty_map[item_code] = self.po_qty_map.get(item_code, 0) + flt(d.arrival_qty)
+			if d.arrival_date and (not entry.arrival_date or d.arrival_date < entry.arrival_date):
+				entry.arrival_date = d.arrival_date
 
 	def prepare_data(self):
 		"""
@@ -361,50 +807,97 @@ class ProductionPlanReport:
 		if not self.orders:
 			return
 
+		# aggregated demand: one line per item / BOM / warehouse / due bucket, each exploded once
+		if aggregated_demand.can_aggregate(self.filters):
+			self.orders = aggregated_demand.aggregate_orders(
+				self.orders, self.filters.based_on, self.filters.demand_bucket or "Week"
+			)
+
+		if self.collect_shortages:
+			self.build_item_stock_summary()
+
+		# Batched allocation records every Bin request in order priority and allocates them
+		# per Bin after the loop. Without raw_material_warehouse each raw material is picked
+		# from exactly one warehouse, which is what lets the requests be deferred.
+		self.allocator = None
+		if (
+			cint(self.filters.batch_allocation)
+			and self.order_logs is None
+			and not (self.collect_shortages or self.filters.raw_material_warehouse)
+		):
+			self.allocator = BatchAllocator(self.bin_details)
+
 		for order in self.orders:
-			# Determine key based on filter
-			key = order.name if self.filters.based_on == "Work Order" else order.bom_no
+			self.prepare_order(order)
 
-			# Skip if no raw materials found for this key
-			if not self.raw_materials_dict.get(key):
-				continue
+		if self.allocator:
+			self.allocator.run()
 
-			# Initialize defaults
-			order.update({
-				"for_warehouse": order.warehouse,
-				"available_qty": 0,   # will be filled if bin has stock
-			})
+	def prepare_order(self, order):
+		# Determine key based on filter
+		key = order.name if self.filters.based_on == "Work Order" else order.bom_no
 
-			# Normalize fields if missing
-			if not getattr(order, "raw_material_code", None):
-				order.raw_material_code = order.get("item_code")
-			if not getattr(order, "delivery_date", None):
-				order.delivery_date = order.get("schedule_date")
-
-			# --- 1. Bin Availability (exact warehouse match) ---
-			bin_data = self.bin_details.get((order.production_item, order.warehouse)) or {}
-			if bin_data and order.qty_to_manufacture:
-				# consume qty from bin up to required
-				available = min(order.qty_to_manufacture, bin_data.get("actual_qty", 0))
-				order.available_qty = available
-				# reduce bin stock accordingly
-				bin_data["actual_qty"] = bin_data.get("actual_qty", 0) - available
-
-			# --- 2. Purchase Order Quantities ---
-			po_qty = self.po_qty_map.get(order.production_item, 0)
-			order.arrival_qty = po_qty
-			# Balance PO qty cannot be negative (we only track shortfall)
-			order.balance_po_qty = max(order.qty_to_manufacture - po_qty, 0)
-
-			# --- 3. Parent Warehouse Quantities (ALL warehouses, negatives kept) ---
-			for wh in self.parent_warehouses:
-				fieldname = frappe.scrub(f"{wh}_qty")
-				qty_val = self.parent_qty_map.get(order.production_item, {}).get(wh, 0)
-				# Keep negatives as-is (user can filter later)
-				order[fieldname] = qty_val
-
-			# --- 4. Update Raw Materials (propagates enriched values) ---
-			self.update_raw_materials(order, key)
+		if self.order_logs is not None:
+			# rows emitted for this order and every Bin lookup with the qty it took, in order
+			self._order_log = frappe._dict(start=len(self.rows), stop=len(self.rows), consumption=[], row_keys=[])
+			self.order_logs.append(self._order_log)
+
+		# Skip if no raw materials found for this key
+		if not self.raw_materials_dict.get(key):
+			return
+
+		# Initialize defaults
+		order.update({
+			"for_warehouse": order.warehouse,
+			"available_qty": 0,   # will be filled if bin has stock
+		})
+
+		# Normalize fields if missing
+		if not getattr(order, "raw_material_code", None):
+			order.raw_material_code = order.get("item_code")
+		if not getattr(order, "delivery_date", None):
+			order.delivery_date = order.get("schedule_date")
+
+		# --- 1. Bin Availability (exact warehouse match) ---
+		bin_key = (order.production_item, order.warehouse)
+		bin_data = self.bin_details.get(bin_key) or {}
+		if bin_data and order.qty_to_manufacture and self.allocator:
+			self.allocator.add_order(bin_key, order, order.qty_to_manufacture)
+		elif bin_data and order.qty_to_manufacture:
+			# consume qty from bin up to required
+			available = min(order.qty_to_manufacture, bin_data.get("actual_qty", 0))
+			order.available_qty = available
+			# reduce bin stock accordingly
+			bin_data["actual_qty"] = bin_data.get("actual_qty", 0) - available
+			self._log_consumption(bin_key, available)
+		else:
+			self._log_consumption(bin_key, 0)
+
+		self.set_order_po_fields(order)
+
+		# --- 4. Update Raw Materials (propagates enriched values) ---
+		self.update_raw_materials(order, key)
+
+		if self._order_log is not None:
+			self._order_log.stop = len(self.rows)
+
+	def set_order_po_fields(self, order):
+		# --- 2. Purchase Order Quantities ---
+		po_qty = self.po_qty_map.get(order.production_item, 0)
+		order.arrival_qty = po_qty
+		# Balance PO qty cannot be negative (we only track shortfall)
+		order.balance_po_qty = max(order.qty_to_manufacture - po_qty, 0)
+
+		# --- 3. Parent Warehouse Quantities (ALL warehouses, negatives kept) ---
+		for wh in ([] if self.collect_shortages else self.parent_warehouses):
+			fieldname = frappe.scrub(f"{wh}_qty")
+			qty_val = self.parent_qty_map.get(order.production_item, {}).get(wh, 0)
+			# Keep negatives as-is (user can filter later)
+			order[fieldname] = qty_val
+
+	def _log_consumption(self, key, qty):
+		if self._order_log is not None:
+			self._order_log.consumption.append((key, qty))
 
 	def update_raw_materials(self, data, key):
 		"""
@@ -424,6 +917,11 @@ class ProductionPlanReport:
 		# fallback default (later overridden if needed)
 		warehouses = self.mrp_warehouses or []
 
+		# multi-level explosion netted against sub-assembly stock, consumed in order priority
+		netted_requirements = None
+		if self.bom_explosion and cint(self.filters.net_subassembly_stock) and self.filters.based_on != "Work Order":
+			netted_requirements = self.bom_explosion.explode(key, data.qty_to_manufacture)
+
 		for rm in raw_materials_for_key:
 
 			# ---- Compute required_qty ----
@@ -435,6 +933,8 @@ class ProductionPlanReport:
 					(per_unit * data.qty_to_manufacture) if per_unit is not None
 					else getattr(rm, "required_qty", 0)
 				)
+				if netted_requirements is not None:
+					rm.required_qty = netted_requirements.get(rm.item_code, 0.0)
 
 			# ---- Decide warehouse list ----
 			if not warehouses:
@@ -450,9 +950,9 @@ class ProductionPlanReport:
 				if item_details and item_details.get("default_warehouse"):
 					warehouses = [item_details["default_warehouse"]]
 
-			# explicit override: use children of selected raw_material_warehouse
+			# explicit override: use children of selected raw_material_warehouse (resolved once in get_bin_details)
 			if self.filters.raw_material_warehouse:
-				warehouses = get_child_warehouses(self.filters.raw_material_warehouse)
+				warehouses = self.mrp_warehouses
 
 			# ---- Allocation ----
 			rm.remaining_qty = rm.required_qty  # start with total requirement
@@ -467,36 +967,38 @@ class ProductionPlanReport:
 				and rm.remaining_qty != rm.required_qty
 			):
 				# construct fallback row
-				row = self.get_args()
 				rm.warehouse = self.filters.raw_material_warehouse
 				rm.required_qty = rm.remaining_qty
 				rm.allotted_qty = 0
-				row.update(rm)
 
-				# enrich with parent / PO / other metadata
-				self._enrich_row_parent_po_fields(row, rm.item_code)
+				if self.collect_shortages:
+					self._add_shortage(rm.item_code, rm.required_qty, rm.warehouse)
+					continue
 
-				# push to report dataset
-				self.data.append(row)
+				# push to report dataset (enriched with parent / PO metadata when materialized)
+				self.rows.append(PlanRow(rm.item_code, dict(rm)))
+				if self._order_log is not None:
+					self._order_log.row_keys.append(None)
 			
-	# updated pick_materials_from_warehouses (adds enrichment before append)
 	def pick_materials_from_warehouses(self, args, order_data, warehouses):
 		"""
-		This function largely preserves your existing logic, but before appending
-		each row to self.data we call _enrich_row_parent_po_fields(row, item_code).
+		This function largely preserves your existing logic; each emitted row is
+		appended to self.rows as a PlanRow and enriched when it is materialized.
 		"""
+		if self.allocator:
+			return self._defer_pick(args, order_data, warehouses[0])
+
 		for index, warehouse in enumerate(warehouses):
 			if not args.remaining_qty:
 				return
 
-			row = self.get_args()
-
 			key = (args.item_code, warehouse)
 			bin_data = self.bin_details.get(key)
 
-			if bin_data:
-				# copy bin fields (actual_qty, ordered_qty, projected_qty)
-				row.update(bin_data)
+			row = None
+			if not self.collect_shortages:
+				# snapshot the bin before this allocation consumes it
+				row = PlanRow(args.item_code, None, bin=bin_data, purchase=self.purchase_details.get(key))
 
 			args.allotted_qty = 0
 			if bin_data and bin_data.get("actual_qty") > 0:
@@ -505,24 +1007,50 @@ class ProductionPlanReport:
 				)
 				args.remaining_qty -= args.allotted_qty
 				bin_data["actual_qty"] -= args.allotted_qty
+			self._log_consumption(key, args.allotted_qty)
 
 			if (self.mrp_warehouses and (args.allotted_qty or index == len(warehouses) - 1)) or not self.mrp_warehouses:
+				if self.collect_shortages:
+					args.warehouse = warehouse
+					self._add_shortage(args.item_code, args.required_qty, warehouse)
+					continue
+
 				if not self.index:
-					# first time for this order - copy order header fields
-					row.update(order_data)
+					# first time for this order - carry order header fields
+					row.header = order_data
 					self.index += 1
 
 				args.warehouse = warehouse
-				row.update(args)
+				row.fields = dict(args)
 
-				# merge any purchase-details (arrival_date, arrival_qty for this warehouse)
-				if self.purchase_details.get(key):
-					row.update(self.purchase_details.get(key))
+				self.rows.append(row)
+				if self._order_log is not None:
+					self._order_log.row_keys.append(key)
 
-				# --- NEW: add parent warehouse columns, POQty and balance ---
-				self._enrich_row_parent_po_fields(row, args.item_code)
+	def _defer_pick(self, args, order_data, warehouse):
+		"""
+		Batched counterpart of pick_materials_from_warehouses for a single warehouse: the row
+		is emitted now, allotted_qty / remaining_qty and the Bin snapshot are filled by
+		BatchAllocator.run once all requests are known.
+		"""
+		if not args.remaining_qty:
+			return
+
+		key = (args.item_code, warehouse)
+		bin_data = self.bin_details.get(key)
+		row = PlanRow(args.item_code, None, bin=bin_data, purchase=self.purchase_details.get(key))
+
+		if not self.index:
+			row.header = order_data
+			self.index += 1
+
+		args.allotted_qty = 0
+		args.warehouse = warehouse
+		row.fields = dict(args)
+		if bin_data:
+			self.allocator.add_row(key, row, args.required_qty)
 
-				self.data.append(row)
+		self.rows.append(row)
 
 	def get_args(self):
 		return frappe._dict(
@@ -569,19 +1097,26 @@ class ProductionPlanReport:
 		- self.parent_qty_map: { parent_wh: { item_code: qty, ... }, ... }
 		
 		Includes all warehouses, keeps 0 and negative values for display.
+		With a rollup_depth or rollup_warehouses filter, stock is rolled up to several levels instead.
 		"""
-		warehouses = frappe.get_all("Warehouse", fields=["name", "parent_warehouse"])
-		wh_map = {w.name: w.parent_warehouse for w in warehouses}
+		if cint(self.filters.rollup_depth) or self.filters.rollup_warehouses:
+			return self.build_rollup_warehouse_data()
 
-		stock_map = {}  # parent_wh -> { item_code: qty }
+		wh_map = {w.name: w.parent_warehouse for w in self.warehouse_tree.warehouses}
 
-		# Use bin_details, because that's where actual stock qtys are stored
-		for (item_code, wh), bin_data in (self.bin_details or {}).items():
-			qty = flt(bin_data.get("actual_qty", 0))
+		if self.snapshot_parent_qty_map is not None:
+			# the snapshot stores each Bin's parent warehouse and comes grouped by it already
+			stock_map = self.snapshot_parent_qty_map
+		else:
+			stock_map = {}  # parent_wh -> { item_code: qty }
+
+			# Use bin_details, because that's where actual stock qtys are stored
+			for (item_code, wh), bin_data in (self.bin_details or {}).items():
+				qty = flt(bin_data.get("actual_qty", 0))
 
-			parent = wh_map.get(wh) or wh
-			stock_map.setdefault(parent, {})
-			stock_map[parent][item_code] = stock_map[parent].get(item_code, 0) + qty
+				parent = wh_map.get(wh) or wh
+				stock_map.setdefault(parent, {})
+				stock_map[parent][item_code] = stock_map[parent].get(item_code, 0) + qty
 
 		# Ensure every parent warehouse is included, even if qty=0
 		for wh in wh_map.values():
@@ -592,8 +1127,91 @@ class ProductionPlanReport:
 		self.parent_qty_map = stock_map
 		self.parent_warehouses = sorted(stock_map.keys())
 
+		if self.warehouse_scope is not None:
+			self._drop_empty_parent_columns()
+
+	def get_rollup_warehouses(self):
+		"""
+		Group warehouses to roll stock up to: the rollup_warehouses filter if given,
+		else every group warehouse in the top rollup_depth levels of the tree.
+		"""
+		if self.filters.rollup_warehouses:
+			return sorted(set(frappe.parse_json(self.filters.rollup_warehouses)))
+
+		depth = cint(self.filters.rollup_depth)
+		return sorted(
+			d.name
+			for d in self.warehouse_tree.warehouses
+			if d.is_group and len(self.warehouse_tree.ancestors(d.name)) < depth
+		)
+
+	def build_rollup_warehouse_data(self):
+		"""
+		Multi-level variant of build_parent_warehouse_data. Every Bin counts towards each
+		selected group warehouse it sits under (nested-set lft/rgt join), and the per-group
+		totals come straight from one GROUP BY. The second branch of the query gives the
+		per-item stock used for balance_po_qty, so stock is not counted once per level.
+		"""
+		targets = self.get_rollup_targets()
+
+		self.parent_qty_map = {wh: {} for wh in targets}
+		self.parent_warehouses = targets
+		self.item_stock_totals = {}
+
+		if not self.item_codes:
+			return
+
+		rows = self.rollup_rows if self.rollup_rows is not None else self.query_rollup_stock(targets)
+		for d in rows:
+			if d.parent_warehouse:
+				self.parent_qty_map[d.parent_warehouse][d.item_code] = flt(d.qty)
+			else:
+				self.item_stock_totals[d.item_code] = flt(d.qty)
+
+		if self.warehouse_scope is not None:
+			self._drop_empty_parent_columns()
+
+	def get_rollup_targets(self):
+		targets = self.get_rollup_warehouses()
+		if self.warehouse_scope is not None:
+			targets = [wh for wh in targets if wh in self.warehouse_scope]
+		return targets
+
+	def query_rollup_stock(self, targets):
+		# snapshot rows share the Bin columns; rows without a Bin hold no stock
+		table = f"tab{SNAPSHOT_DOCTYPE}" if self.use_stock_snapshot() else "tabBin"
+		scope_condition = ""
+		params = {"targets": tuple(targets) or ("",)}
+		if self.warehouse_scope is not None:
+			scope_condition = "AND bin.warehouse IN %(scope)s"
+			params["scope"] = tuple(self.warehouse_scope) or ("",)
+
+		# every row belongs to one item, so the item codes can be chunked
+		return bulk_lookup.sql_in(
+			f"""
+			SELECT grp.name AS parent_warehouse, bin.item_code, SUM(bin.actual_qty) AS qty
+			FROM `{table}` bin
+			INNER JOIN `tabWarehouse` wh ON wh.name = bin.warehouse
+			INNER JOIN `tabWarehouse` grp ON grp.lft <= wh.lft AND grp.rgt >= wh.rgt
+			WHERE bin.item_code IN %(item_codes)s AND grp.name IN %(targets)s {scope_condition}
+			GROUP BY grp.name, bin.item_code
+			UNION ALL
+			SELECT NULL AS parent_warehouse, bin.item_code, SUM(bin.actual_qty) AS qty
+			FROM `{table}` bin
+			WHERE bin.item_code IN %(item_codes)s {scope_condition}
+			GROUP BY bin.item_code
+			""",
+			self.item_codes,
+			params,
+			param="item_codes",
+			as_dict=True,
+		)
+
 	def get_columns(self):
 		based_on = self.filters.based_on
+		# parent warehouses and PO maps are final here; rows are enriched against them from now on
+		self.parent_fieldnames = None
+		self._item_enrichment = {}
 
 		self.columns = [
 			{"label": _("ID"), "options": based_on, "fieldname": "name", "fieldtype": "Link", "width": 100},
@@ -633,6 +1251,20 @@ class ProductionPlanReport:
 				"width": 120
 			})
 
+		if aggregated_demand.can_aggregate(self.filters):
+			self.columns.append({
+				"label": _("Due Bucket"),
+				"fieldname": "due_bucket",
+				"fieldtype": "Date",
+				"width": 100
+			})
+			self.columns.append({
+				"label": _("Orders"),
+				"fieldname": "order_count",
+				"fieldtype": "Int",
+				"width": 80
+			})
+
 		# Raw Material Specific Columns
 		self.columns.append({
 			"label": _("Raw Material Code"),
@@ -655,10 +1287,10 @@ class ProductionPlanReport:
 		})
 
 		# Add each parent warehouse as its own column with only Qty
-		for wh in self.parent_warehouses:
+		for wh, fieldname in self.get_parent_fieldnames():
 			self.columns.append({
 				"label": _(f"{wh}"),
-				"fieldname": frappe.scrub(f"{wh}_qty"),
+				"fieldname": fieldname,
 				"fieldtype": "Float",
 				"width": 100,
 			})
@@ -0,0 +1,48 @@
+import frappe
+from frappe.utils import cint, flt, get_first_day, get_first_day_of_week, getdate
+
+BUCKETS = ("Week", "Month")
+DUE_DATE_FIELDS = {"Sales Order": "delivery_date", "Material Request": "schedule_date"}
+
+
+def can_aggregate(filters):
+	"""Only BOM based orders are aggregated; Work Order raw materials belong to one Work Order each."""
+	return bool(cint(filters.get("aggregate_demand"))) and filters.get("based_on") in DUE_DATE_FIELDS
+
+
+def get_bucket(due_date, bucket="Week"):
+	if not due_date:
+		return None
+	if bucket == "Month":
+		return get_first_day(due_date)
+	return get_first_day_of_week(getdate(due_date))
+
+
+def aggregate_orders(orders, based_on, bucket="Week"):
+	"""
+	Merge order lines into one demand line per (production_item, bom_no, warehouse, due bucket).
+	Groups keep the position and the header (e.g. base_grand_total) of their first line, so the
+	priority of order_by is preserved; qty_to_manufacture is summed and the earliest due date kept.
+	Each group carries order_count and contributing_orders: [ { name, qty, due_date }, ... ]
+	for the drill-back to its order lines.
+	"""
+	due_field = DUE_DATE_FIELDS[based_on]
+	groups = {}
+	for d in orders:
+		due_date = d.get(due_field)
+		key = (d.production_item, d.bom_no, d.warehouse, get_bucket(due_date, bucket))
+
+		group = groups.get(key)
+		if not group:
+			group = groups[key] = frappe._dict(d)
+			group.update(qty_to_manufacture=0.0, order_count=0, due_bucket=key[3], contributing_orders=[])
+
+		group.qty_to_manufacture += flt(d.qty_to_manufacture)
+		group.order_count += 1
+		group.contributing_orders.append(
+			{"name": d.name, "qty": flt(d.qty_to_manufacture), "due_date": due_date}
+		)
+		if due_date and (not group.get(due_field) or due_date < group[due_field]):
+			group[due_field] = due_date
+
+	return list(groups.values())
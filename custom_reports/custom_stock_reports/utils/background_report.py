@@ -0,0 +1,204 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cint, format_datetime, gzip_compress, gzip_decompress, now_datetime
+
+from custom_reports.custom_stock_reports.utils import report_cache
+
+REPORT_NAME = "Custom Production Planning Report"
+PROGRESS_EVENT = "production_plan_progress"
+RESULT_CACHE_TTL = 600  # seconds a decompressed result stays in Redis for paging
+
+
+@frappe.whitelist(methods=["POST"])
+def enqueue_report(filters):
+	"""
+	Queue the planning run on the long queue and store the result as a Prepared Report.
+	Called by the report JS: report runs are read-only GET requests that never commit, so like
+	frappe's own background_enqueue_run, queueing gets a POST request of its own.
+	A run still queued for the same filters is returned instead of queueing another one.
+	"""
+	filters = get_run_filters(frappe.parse_json(filters))
+
+	if not frappe.get_doc("Report", REPORT_NAME).is_permitted():
+		frappe.throw(_("You don't have access to Report: {0}").format(REPORT_NAME), frappe.PermissionError)
+
+	prepared_report = get_last_prepared_report(filters)
+	if prepared_report and prepared_report.status in ("Queued", "Started"):
+		return {"name": prepared_report.name, "status": prepared_report.status}
+
+	prepared_report = insert_prepared_report(filters)
+
+	frappe.enqueue(
+		"custom_reports.custom_stock_reports.utils.background_report.run_report_job",
+		queue="long",
+		timeout=3600,
+		prepared_report=prepared_report.name,
+		filters=filters,
+		user=frappe.session.user,
+		enqueue_after_commit=True,
+	)
+
+	return {"name": prepared_report.name, "status": prepared_report.status}
+
+
+def get_background_result(filters):
+	"""
+	What execute() returns with the run_in_background filter: the last background run of the user
+	for these filters, in the shape execute() is expected to return. Runs are only started by
+	enqueue_report.
+	"""
+	prepared_report = get_last_prepared_report(get_run_filters(filters))
+
+	if not prepared_report:
+		return [], [], _("No background run for these filters yet, use Prepare in Background to start one.")
+
+	if prepared_report.status == "Completed":
+		result = get_prepared_result(prepared_report.name)
+		message = _("Showing background run {0} from {1}.").format(
+			prepared_report.name, format_datetime(prepared_report.report_end_time)
+		)
+		return result.get("columns"), result.get("result"), message
+
+	if prepared_report.status == "Error":
+		return [], [], _("Background report {0} failed.").format(prepared_report.name)
+
+	return [], [], _("Report is being prepared in the background ({0}).").format(prepared_report.name)
+
+
+def get_run_filters(filters):
+	"""Filters a background run is stored and looked up by: run_in_background and empty values dropped."""
+	return frappe._dict(
+		{
+			key: value
+			for key, value in filters.items()
+			if key != "run_in_background" and value not in (None, "", [], 0, "0")
+		}
+	)
+
+
+def get_last_prepared_report(filters):
+	return frappe.db.get_value(
+		"Prepared Report",
+		{"report_name": REPORT_NAME, "owner": frappe.session.user, "filters": frappe.as_json(filters)},
+		["name", "status", "report_end_time"],
+		as_dict=True,
+		order_by="creation desc",
+	)
+
+
+def insert_prepared_report(filters, status="Queued"):
+	prepared_report = frappe.new_doc("Prepared Report")
+	prepared_report.update(
+		{
+			"report_name": REPORT_NAME,
+			"ref_report_doctype": REPORT_NAME,
+			"filters": frappe.as_json(filters),
+			"status": status,
+			"queued_by": frappe.session.user,
+			"queued_at": now_datetime(),
+		}
+	)
+	prepared_report.owner = frappe.session.user
+	# db_insert skips Prepared Report's own after_insert, which would run the report a second time
+	prepared_report.db_insert()
+	return prepared_report
+
+
+def save_prepared_result(prepared_report, columns, data):
+	"""Attach the result to the Prepared Report and mark it Completed."""
+	# same attachment format as frappe's own prepared reports
+	frappe.get_doc(
+		{
+			"doctype": "File",
+			"file_name": f"{frappe.scrub(REPORT_NAME)}.json.gz",
+			"attached_to_doctype": "Prepared Report",
+			"attached_to_name": prepared_report,
+			"content": gzip_compress(
+				frappe.safe_encode(frappe.as_json({"columns": columns, "result": data}))
+			),
+			"is_private": 1,
+		}
+	).insert(ignore_permissions=True)
+
+	frappe.db.set_value(
+		"Prepared Report",
+		prepared_report,
+		{"status": "Completed", "report_end_time": now_datetime()},
+	)
+
+
+def run_report_job(prepared_report, filters, user):
+	from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import (
+		ProductionPlanReport,
+	)
+
+	def publish(stage, index, total):
+		frappe.publish_realtime(
+			PROGRESS_EVENT,
+			{"prepared_report": prepared_report, "stage": stage, "progress": index, "total": total},
+			user=user,
+		)
+
+	frappe.db.set_value("Prepared Report", prepared_report, "status", "Started")
+	frappe.db.commit()
+
+	try:
+		columns, data = ProductionPlanReport(filters, progress_callback=publish).execute_report()
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.set_value(
+			"Prepared Report",
+			prepared_report,
+			{"status": "Error", "error_message": frappe.get_traceback()},
+		)
+		frappe.db.commit()
+		publish("error", 0, 0)
+		return
+
+	save_prepared_result(prepared_report, columns, data)
+	frappe.db.commit()
+
+	report_cache.set_cached_result(filters, (columns, data))
+	frappe.publish_realtime(
+		PROGRESS_EVENT,
+		{"prepared_report": prepared_report, "stage": "completed", "status": "Completed", "count": len(data)},
+		user=user,
+	)
+
+
+@frappe.whitelist()
+def get_report_page(prepared_report, start=0, page_length=500):
+	"""Return one window of a completed background run; columns are sent with the first page."""
+	start, page_length = cint(start), cint(page_length)
+
+	doc = frappe.get_doc("Prepared Report", prepared_report)
+	if doc.owner != frappe.session.user:
+		doc.check_permission("read")
+
+	if doc.status != "Completed":
+		return {"status": doc.status}
+
+	result = get_prepared_result(prepared_report)
+	rows = result.get("result") or []
+
+	return {
+		"status": doc.status,
+		"columns": result.get("columns") if not start else None,
+		"result": rows[start : start + page_length],
+		"total": len(rows),
+	}
+
+
+def get_prepared_result(prepared_report):
+	cache_key = f"{report_cache.CACHE_PREFIX}:prepared:{prepared_report}"
+	result = frappe.cache().get_value(cache_key)
+	if result is None:
+		attachment = frappe.get_last_doc(
+			"File", filters={"attached_to_doctype": "Prepared Report", "attached_to_name": prepared_report}
+		)
+		result = json.loads(gzip_decompress(attachment.get_content()))
+		frappe.cache().set_value(cache_key, result, expires_in_sec=RESULT_CACHE_TTL)
+
+	return result
@@ -0,0 +1,269 @@
+import itertools
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, nowdate
+from frappe.utils.csvutils import to_csv
+
+from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import (
+	ProductionPlanReport,
+)
+from custom_reports.custom_stock_reports.utils import background_report, bulk_lookup
+from custom_reports.custom_stock_reports.utils.bom_explosion import BOMExplosion
+from custom_reports.custom_stock_reports.utils.plan_window import VIEW_FILTERS
+from custom_reports.custom_stock_reports.utils.warehouse_tree import get_warehouse_tree
+
+REPORT_NAME = "Custom Production Planning Report"
+OUTPUTS = ("Prepared Report", "CSV")
+# filters that only matter for interactive runs
+IGNORED_FILTERS = ("run_in_background", "concurrent_loading", "sql_pipeline", "incremental", *VIEW_FILTERS)
+# filter sets for the scheduled batch, see run_scheduled_batch
+CONFIG_KEY = "production_plan_batch"
+
+
+class ReferenceData:
+	"""
+	Reference data shared by every plan of one batch, each piece loaded once on first use:
+	the Warehouse tree, BOM items, default BOMs, Item Defaults per company and all Bins of an item.
+	Loaded rows are never handed out directly, allocation mutates what it gets.
+	"""
+
+	def __init__(self):
+		self.warehouse_tree = None
+		self.bom_items = {}  # (bom item doctype, bom_no) -> [ row, ... ]
+		self.bom_children = {}  # BOMExplosion graph: bom_no -> [ row, ... ]
+		self.bom_item_names = {}
+		self.default_boms = {}  # item_code -> default_bom
+		self.item_defaults = {}  # company -> { item_code: Item Default row or None }
+		self.bins = {}  # item_code -> [ Bin row, ... ], unscoped
+
+	def get_warehouse_tree(self):
+		if self.warehouse_tree is None:
+			self.warehouse_tree = get_warehouse_tree()
+		return self.warehouse_tree
+
+	def missing(self, cache, keys):
+		return list({key for key in keys if key and key not in cache})
+
+	def get_bins(self, item_codes):
+		missing = self.missing(self.bins, item_codes)
+		if missing:
+			for item_code in missing:
+				self.bins[item_code] = []
+			for d in bulk_lookup.get_all_in(
+				"Bin",
+				"item_code",
+				missing,
+				fields=["warehouse", "item_code", "actual_qty", "ordered_qty", "projected_qty"],
+			):
+				self.bins[d.item_code].append(d)
+
+		return [d for item_code in set(item_codes) for d in self.bins.get(item_code, [])]
+
+
+class SharedBOMExplosion(BOMExplosion):
+	"""BOMExplosion over the BOM graph of the batch; only BOMs no plan has loaded yet are queried."""
+
+	def __init__(self, reference, bom_nos):
+		self.reference = reference
+		super().__init__(bom_nos)
+
+	def load(self, bom_nos):
+		reference = self.reference
+		missing = reference.missing(reference.bom_children, bom_nos)
+		if missing:
+			loaded = BOMExplosion(missing)
+			for bom_no, rows in loaded.children.items():
+				reference.bom_children.setdefault(bom_no, rows)
+			reference.bom_item_names.update(loaded.item_names)
+
+		# explosion only reads the graph, so it is shared instead of copied
+		self.children = reference.bom_children
+		self.item_names = reference.bom_item_names
+
+	def load_stock(self, warehouses=None):
+		for d in self.reference.get_bins(list(self.subassembly_items())):
+			if warehouses is None or d.warehouse in warehouses:
+				self.stock[d.item_code] = self.stock.get(d.item_code, 0) + flt(d.actual_qty)
+
+
+class BatchProductionPlanReport(ProductionPlanReport):
+	"""ProductionPlanReport reading warehouses, BOMs, Item Defaults and Bins from the batch's ReferenceData."""
+
+	def __init__(self, filters, reference, progress_callback=None):
+		super().__init__(filters, progress_callback=progress_callback)
+		self.reference = reference
+
+	def get_warehouse_tree(self):
+		return self.reference.get_warehouse_tree()
+
+	def get_bom_explosion(self, bom_nos):
+		return SharedBOMExplosion(self.reference, bom_nos)
+
+	def resolve_default_boms(self, orders):
+		reference = self.reference
+		missing = reference.missing(
+			reference.default_boms, [d.production_item for d in orders if not d.bom_no]
+		)
+		if missing:
+			reference.default_boms.update(dict.fromkeys(missing))
+			reference.default_boms.update(
+				bulk_lookup.get_all_in("Item", "name", missing, fields=["name", "default_bom"], as_list=True)
+			)
+
+		for d in orders:
+			if not d.bom_no:
+				d.bom_no = reference.default_boms.get(d.production_item)
+
+	def get_bom_items(self, bom_nos):
+		bom_item_doctype = (
+			"BOM Explosion Item" if self.filters.include_subassembly_raw_materials else "BOM Item"
+		)
+		cache = self.reference.bom_items
+		keys = [(bom_item_doctype, bom_no) for bom_no in bom_nos]
+
+		missing = self.reference.missing(cache, keys)
+		if missing:
+			for key in missing:
+				cache[key] = []
+			for d in super().get_bom_items([bom_no for _doctype, bom_no in missing]):
+				cache[(bom_item_doctype, d.parent)].append(d)
+
+		return [frappe._dict(d) for key in dict.fromkeys(keys) for d in cache.get(key, [])]
+
+	def load_item_details(self, item_codes):
+		company_defaults = self.reference.item_defaults.setdefault(self.filters.company, {})
+		missing = self.reference.missing(company_defaults, item_codes)
+		if missing:
+			company_defaults.update(dict.fromkeys(missing))
+			for d in bulk_lookup.get_all_in(
+				"Item Default",
+				"parent",
+				missing,
+				fields=["parent", "default_warehouse"],
+				filters={"company": self.filters.company},
+			):
+				company_defaults[d.parent] = d
+
+		for item_code in set(item_codes):
+			if company_defaults.get(item_code):
+				self.item_details[item_code] = company_defaults[item_code]
+
+	def load_bins(self, item_codes, modified_after=None):
+		# batches never run incrementally (see IGNORED_FILTERS), so there is no modified_after here
+		return [
+			frappe._dict(d)
+			for d in self.reference.get_bins(item_codes)
+			if self.warehouse_scope is None or d.warehouse in self.warehouse_scope
+		]
+
+
+def expand_filter_sets(filter_sets):
+	"""
+	Filter sets with a list of companies or based_on modes stand for every combination, e.g.
+	{ "company": ["A", "B"], "based_on": ["Sales Order", "Work Order"] } gives four plans.
+	"""
+	expanded = []
+	for filters in filter_sets:
+		filters = {k: v for k, v in filters.items() if k not in IGNORED_FILTERS}
+		companies = filters.get("company")
+		modes = filters.get("based_on")
+		companies = companies if isinstance(companies, list) else [companies]
+		modes = modes if isinstance(modes, list) else [modes]
+
+		for company, based_on in itertools.product(companies, modes):
+			expanded.append(frappe._dict(filters, company=company, based_on=based_on))
+
+	return expanded
+
+
+def run_batch(filter_sets, output="Prepared Report"):
+	"""
+	Compute one plan per filter set on shared reference data and store each result as a
+	Completed Prepared Report or as a private CSV File. A failing plan is logged and skipped.
+	Returns [ { filters, status, rows, name }, ... ].
+	"""
+	if output not in OUTPUTS:
+		frappe.throw(_("Output must be one of {0}").format(", ".join(OUTPUTS)))
+
+	reference = ReferenceData()
+	results = []
+	for filters in expand_filter_sets(filter_sets):
+		result = frappe._dict(filters=filters, status="Completed", rows=0, name=None)
+		results.append(result)
+		try:
+			columns, data = BatchProductionPlanReport(filters, reference).execute_report()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error("Production Plan Batch")
+			result.status = "Error"
+			continue
+
+		result.rows = len(data)
+		if output == "CSV":
+			result.name = save_csv(filters, columns, data)
+		else:
+			result.name = background_report.insert_prepared_report(filters, status="Started").name
+			background_report.save_prepared_result(result.name, columns, data)
+		frappe.db.commit()
+
+	return results
+
+
+def save_csv(filters, columns, data):
+	rows = [[column.get("label") for column in columns]]
+	rows.extend([row.get(column.get("fieldname")) for column in columns] for row in data)
+
+	file_name = "-".join(
+		frappe.scrub(str(part))
+		for part in (REPORT_NAME, filters.company, filters.based_on, nowdate())
+		if part
+	)
+	file = frappe.get_doc(
+		{
+			"doctype": "File",
+			"file_name": f"{file_name}.csv",
+			"content": to_csv(rows),
+			"is_private": 1,
+		}
+	).insert(ignore_permissions=True)
+	return file.name
+
+
+@frappe.whitelist()
+def enqueue_batch(filter_sets, output="Prepared Report"):
+	"""Queue a batch of plans, e.g. every company and based_on mode; see run_batch."""
+	if not frappe.get_doc("Report", REPORT_NAME).is_permitted():
+		frappe.throw(_("You don't have access to Report: {0}").format(REPORT_NAME), frappe.PermissionError)
+
+	filter_sets = frappe.parse_json(filter_sets)
+	if isinstance(filter_sets, dict):
+		filter_sets = [filter_sets]
+
+	frappe.enqueue(
+		"custom_reports.custom_stock_reports.utils.batch_planning.run_batch",
+		queue="long",
+		timeout=4 * 3600,
+		filter_sets=filter_sets,
+		output=output,
+		enqueue_after_commit=True,
+	)
+	return len(expand_filter_sets(filter_sets))
+
+
+def run_scheduled_batch():
+	"""
+	scheduler_events hook: queue the batch configured in site_config, e.g.
+	"production_plan_batch": { "filter_sets": [ { "company": ["A", "B"], "based_on": "Sales Order" } ], "output": "CSV" }
+	"""
+	config = frappe.conf.get(CONFIG_KEY)
+	if not config or not config.get("filter_sets"):
+		return
+
+	frappe.enqueue(
+		"custom_reports.custom_stock_reports.utils.batch_planning.run_batch",
+		queue="long",
+		timeout=cint(config.get("timeout")) or 4 * 3600,
+		filter_sets=config["filter_sets"],
+		output=config.get("output") or "Prepared Report",
+	)
@@ -0,0 +1,635 @@
+"""
+Benchmark harness for the Custom Production Planning Report.
+
+Plans are built from synthetic, ERPNext-shaped fixtures held in memory, so timings do not
+depend on the data of the site the harness runs on:
+
+	bench --site <site> execute custom_reports.custom_stock_reports.utils.benchmark.run --kwargs "{'scale': '10k'}"
+	bench --site <site> execute custom_reports.custom_stock_reports.utils.benchmark.compare \
+		--kwargs "{'baseline': 'bench-10k.json', 'current': 'bench-10k-new.json'}"
+	bench --site <site> execute custom_reports.custom_stock_reports.utils.benchmark.purchase_lookup
+
+Every data loader of the report is replaced by a fixture lookup that the report's own
+instrumentation counts as one query, which is what the loader issues on a live site. That
+includes the stock snapshot, rollup, concurrent and sql_pipeline loaders, so those filters
+are benchmarked on the fixtures too; SQL that still reaches frappe.db is counted as well.
+"""
+
+import datetime
+import json
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import flt
+
+from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import (
+	ProductionPlanReport,
+)
+from custom_reports.custom_stock_reports.utils import material_request_mapper
+from custom_reports.custom_stock_reports.utils.bom_explosion import BOMExplosion
+from custom_reports.custom_stock_reports.utils.instrumentation import StageInstrumentation
+from custom_reports.custom_stock_reports.utils.warehouse_tree import WarehouseTree
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+ORDER_BY = {
+	"Sales Order": "Delivery Date",
+	"Material Request": "Required Date",
+	"Work Order": "Planned Start Date",
+}
+# differences below this many seconds are noise, compare() ignores them
+MIN_SECONDS = 0.005
+
+
+class PlanFixtures:
+	"""
+	Synthetic planning data for `lines` order lines of every document type:
+	- a four level warehouse tree (company / site / zone / bin location)
+	- finished goods with BOMs of raw materials and one or two levels of sub-assemblies
+	- Sales Order, Material Request and Work Order lines, Work Order Items
+	- Bins, Item Defaults and pending Purchase Order quantities
+	"""
+
+	def __init__(self, lines=1_000, seed=42, sites=4, zones=2, locations=5):
+		self.rng = random.Random(seed)
+		self.lines = lines
+		self.company = "_Bench Company"
+		self.make_warehouses(sites, zones, locations)
+		self.make_items()
+		self.make_boms()
+		self.make_orders()
+		self.make_stock()
+
+	def make_warehouses(self, sites, zones, locations):
+		self.warehouses = []
+		self.leaf_warehouses = []
+		counter = iter(range(1, 10**6))
+
+		def add(name, parent, children=None):
+			d = frappe._dict(
+				name=name,
+				parent_warehouse=parent,
+				lft=next(counter),
+				is_group=int(children is not None),
+				company=self.company,
+			)
+			self.warehouses.append(d)
+			for child_name, grandchildren in children or []:
+				add(child_name, name, grandchildren)
+			if children is None:
+				self.leaf_warehouses.append(name)
+			d.rgt = next(counter)
+
+		add(
+			"All Warehouses - BC",
+			None,
+			[
+				(
+					f"Site {s} - BC",
+					[
+						(
+							f"Zone {s}-{z} - BC",
+							[(f"Location {s}-{z}-{loc} - BC", None) for loc in range(locations)],
+						)
+						for z in range(zones)
+					],
+				)
+				for s in range(sites)
+			],
+		)
+
+	def make_items(self):
+		self.finished_goods = [f"BFG-{i:05d}" for i in range(max(20, self.lines // 20))]
+		self.subassemblies = [f"BSA-{i:05d}" for i in range(max(10, self.lines // 40))]
+		self.raw_materials = [f"BRM-{i:05d}" for i in range(max(50, self.lines // 5))]
+		# the first half of the sub-assemblies only use raw materials, the second half also one of the first
+		self.deep_subassemblies = self.subassemblies[: len(self.subassemblies) // 2]
+
+	def make_boms(self):
+		rng = self.rng
+		self.bom_items = {}  # bom_no -> [ { item_code, item_name, bom_no, qty_per_unit }, ... ]
+
+		def bom_row(item_code, bom_no=None):
+			return frappe._dict(
+				item_code=item_code, item_name=item_code, bom_no=bom_no, qty_per_unit=flt(rng.randint(1, 6))
+			)
+
+		for item_code in self.subassemblies:
+			rows = [bom_row(rm) for rm in rng.sample(self.raw_materials, rng.randint(2, 5))]
+			if item_code not in self.deep_subassemblies:
+				sub = rng.choice(self.deep_subassemblies)
+				rows.append(bom_row(sub, f"BOM-{sub}"))
+			self.bom_items[f"BOM-{item_code}"] = rows
+
+		for item_code in self.finished_goods:
+			rows = [bom_row(rm) for rm in rng.sample(self.raw_materials, rng.randint(3, 8))]
+			for sub in rng.sample(self.subassemblies, rng.randint(0, 2)):
+				rows.append(bom_row(sub, f"BOM-{sub}"))
+			self.bom_items[f"BOM-{item_code}"] = rows
+
+		self.exploded = {}
+		for bom_no in self.bom_items:
+			self.explode(bom_no)
+
+	def explode(self, bom_no):
+		"""Leaf raw material qty per unit, the shape of BOM Explosion Item."""
+		if bom_no not in self.exploded:
+			exploded = {}
+			for d in self.bom_items[bom_no]:
+				children = self.explode(d.bom_no) if d.bom_no else {d.item_code: 1.0}
+				for item_code, qty in children.items():
+					exploded[item_code] = exploded.get(item_code, 0.0) + d.qty_per_unit * qty
+			self.exploded[bom_no] = exploded
+		return self.exploded[bom_no]
+
+	def make_orders(self):
+		rng = self.rng
+		start = datetime.date(2026, 1, 1)
+		self.orders = {doctype: [] for doctype in ORDER_BY}
+		self.work_order_items = {}
+
+		def line(name, item_code):
+			return frappe._dict(
+				name=name,
+				production_item=item_code,
+				production_item_name=item_code,
+				bom_no=f"BOM-{item_code}" if rng.random() < 0.9 else None,
+				stock_uom="Nos",
+				warehouse=rng.choice(self.leaf_warehouses),
+				qty_to_manufacture=flt(rng.randint(1, 50)),
+			)
+
+		for i in range(self.lines):
+			d = line(f"BSO-{i // 5:06d}", rng.choice(self.finished_goods))
+			d.delivery_date = start + datetime.timedelta(days=rng.randint(0, 365))
+			d.base_grand_total = flt(rng.randint(1_000, 500_000))
+			self.orders["Sales Order"].append(d)
+
+			d = line(f"BMR-{i // 5:06d}", rng.choice(self.finished_goods))
+			d.schedule_date = start + datetime.timedelta(days=rng.randint(0, 365))
+			self.orders["Material Request"].append(d)
+
+			d = line(f"BWO-{i:06d}", rng.choice(self.finished_goods))
+			d.bom_no = f"BOM-{d.production_item}"
+			d.planned_start_date = datetime.datetime.combine(start, datetime.time()) + datetime.timedelta(
+				hours=rng.randint(0, 365 * 24)
+			)
+			self.orders["Work Order"].append(d)
+			self.work_order_items[d.name] = [
+				frappe._dict(
+					parent=d.name,
+					item_code=item_code,
+					raw_material_name=item_code,
+					warehouse=rng.choice(self.leaf_warehouses),
+					required_qty=qty * d.qty_to_manufacture,
+				)
+				for item_code, qty in self.explode(d.bom_no).items()
+			]
+
+	def make_stock(self):
+		rng = self.rng
+		self.bins = {}  # item_code -> [ bin, ... ]
+		for item_code in self.finished_goods + self.subassemblies + self.raw_materials:
+			self.bins[item_code] = [
+				frappe._dict(
+					item_code=item_code,
+					warehouse=warehouse,
+					actual_qty=flt(rng.randint(-5, 400)),
+					ordered_qty=flt(rng.randint(0, 50)),
+					projected_qty=flt(rng.randint(-50, 400)),
+				)
+				for warehouse in rng.sample(self.leaf_warehouses, rng.randint(1, 4))
+			]
+
+		self.item_defaults = {
+			item_code: frappe._dict(parent=item_code, default_warehouse=rng.choice(self.leaf_warehouses))
+			for item_code in self.raw_materials
+			if rng.random() < 0.5
+		}
+
+		self.purchases = {}  # item_code -> [ { item_code, warehouse, arrival_date, arrival_qty }, ... ]
+		for item_code in rng.sample(self.raw_materials, len(self.raw_materials) * 3 // 10):
+			self.purchases[item_code] = [
+				frappe._dict(
+					item_code=item_code,
+					warehouse=warehouse,
+					arrival_date=datetime.date(2026, 1, 1) + datetime.timedelta(days=rng.randint(0, 90)),
+					arrival_qty=flt(rng.randint(10, 500)),
+				)
+				for warehouse in rng.sample(self.leaf_warehouses, rng.randint(1, 2))
+			]
+
+
+class SyntheticBOMExplosion(BOMExplosion):
+	def __init__(self, fixtures, instrumentation, bom_nos):
+		self.fixtures = fixtures
+		self.instrumentation = instrumentation
+		super().__init__(bom_nos)
+
+	def load(self, bom_nos):
+		frontier = {b for b in bom_nos if b}
+		while frontier:
+			rows = []
+			for bom_no in frontier:
+				self.children.setdefault(bom_no, [])
+				for d in self.fixtures.bom_items.get(bom_no, []):
+					row = frappe._dict(d, parent=bom_no)
+					self.children[bom_no].append(row)
+					self.item_names.setdefault(row.item_code, row.item_name)
+					rows.append(row)
+			self.instrumentation.add_query(len(rows))
+			frontier = {d.bom_no for d in rows if d.bom_no} - set(self.children)
+
+	def load_stock(self, warehouses=None):
+		items = self.subassembly_items()
+		if not items:
+			return
+
+		self.instrumentation.add_query(len(items))
+		for item_code in items:
+			self.stock[item_code] = sum(
+				d.actual_qty
+				for d in self.fixtures.bins.get(item_code, [])
+				if warehouses is None or d.warehouse in warehouses
+			)
+
+
+class SyntheticProductionPlanReport(ProductionPlanReport):
+	"""
+	ProductionPlanReport reading PlanFixtures instead of the database. Every loader call is
+	recorded by the report's own instrumentation as one query with the rows it returned.
+	"""
+
+	log_runs = False
+
+	def __init__(self, filters, fixtures, trace_memory=True, progress_callback=None):
+		super().__init__(filters, progress_callback=progress_callback)
+		self.fixtures = fixtures
+		self.instrumentation = StageInstrumentation(trace_memory=trace_memory)
+
+	def fetched(self, rows):
+		self.instrumentation.add_query(len(rows))
+		return rows
+
+	def get_warehouse_tree(self):
+		return WarehouseTree(self.fetched([frappe._dict(d) for d in self.fixtures.warehouses]))
+
+	def get_bom_explosion(self, bom_nos):
+		return SyntheticBOMExplosion(self.fixtures, self.instrumentation, bom_nos)
+
+	def query_open_orders(self, docnames=None):
+		orders = [
+			frappe._dict(d)
+			for d in self.fixtures.orders[self.filters.based_on]
+			if not docnames or d.name in docnames
+		]
+
+		field = {
+			"Delivery Date": "delivery_date",
+			"Total Amount": "base_grand_total",
+			"Required Date": "schedule_date",
+			"Planned Start Date": "planned_start_date",
+		}.get(self.filters.order_by)
+		if field:
+			orders.sort(key=lambda d: d.get(field), reverse=field == "base_grand_total")
+		return self.fetched(orders)
+
+	def get_work_order_items(self, work_orders):
+		return self.fetched(self.fixture_work_order_items(work_orders))
+
+	def resolve_default_boms(self, orders):
+		items_without_bom = {d.production_item for d in orders if not d.bom_no}
+		if items_without_bom:
+			self.fetched(items_without_bom)
+		for d in orders:
+			if not d.bom_no:
+				d.bom_no = f"BOM-{d.production_item}"
+
+	def get_bom_items(self, bom_nos):
+		return self.fetched(self.fixture_bom_items(bom_nos))
+
+	def load_item_details(self, item_codes):
+		for d in self.fetched(self.fixture_item_defaults(item_codes)):
+			self.item_details[d.parent] = d
+
+	def load_bins(self, item_codes, modified_after=None):
+		return self.fetched(self.fixture_bins(item_codes))
+
+	def load_purchase_details(self, item_codes):
+		return self.fetched(self.fixture_purchases(item_codes))
+
+	def load_snapshot(self):
+		"""get_snapshot on the fixtures: one lookup returning bins, pending POs and parent stock."""
+		bins = self.fixture_bins(self.item_codes)
+		purchases = self.fixture_purchases(self.item_codes)
+		parent_qty_map = {}
+		for d in bins:
+			parent_stock = parent_qty_map.setdefault(
+				self.warehouse_tree.parent(d.warehouse) or d.warehouse, {}
+			)
+			parent_stock[d.item_code] = parent_stock.get(d.item_code, 0) + flt(d.actual_qty)
+
+		self.fetched(bins + purchases)
+		return bins, purchases, parent_qty_map
+
+	def query_pipeline(self):
+		"""sql_pipeline.load on the fixtures, counted as the one statement it is on a live site."""
+		default_boms = {d.production_item: f"BOM-{d.production_item}" for d in self.orders if not d.bom_no}
+		if self.filters.based_on == "Work Order":
+			raw_materials = self.fixture_work_order_items([d.name for d in self.orders])
+		else:
+			bom_nos = dict.fromkeys(d.bom_no or default_boms[d.production_item] for d in self.orders)
+			raw_materials = self.fixture_bom_items(bom_nos)
+
+		item_codes = [d.production_item for d in self.orders] + [d.item_code for d in raw_materials]
+		loaded = {
+			"default_boms": default_boms,
+			"raw_materials": raw_materials,
+			"item_details": self.fixture_item_defaults(item_codes),
+			"bins": self.fixture_bins(item_codes),
+			"purchases": self.fixture_purchases(item_codes),
+		}
+		self.fetched([d for key, rows in loaded.items() if key != "default_boms" for d in rows])
+		return loaded
+
+	def query_rollup_stock(self, targets):
+		"""Bin stock per selected group warehouse above it and per item, like the nested-set query."""
+		targets = set(targets)
+		group_qty, item_qty = {}, {}
+		for d in self.fixture_bins(self.item_codes):
+			item_qty[d.item_code] = item_qty.get(d.item_code, 0) + flt(d.actual_qty)
+			for group in [d.warehouse, *self.warehouse_tree.ancestors(d.warehouse)]:
+				if group in targets:
+					key = (group, d.item_code)
+					group_qty[key] = group_qty.get(key, 0) + flt(d.actual_qty)
+
+		rows = [
+			frappe._dict(parent_warehouse=group, item_code=item_code, qty=qty)
+			for (group, item_code), qty in group_qty.items()
+		]
+		rows.extend(
+			frappe._dict(parent_warehouse=None, item_code=item_code, qty=qty)
+			for item_code, qty in item_qty.items()
+		)
+		return self.fetched(rows)
+
+	def run_loaders(self, tasks):
+		# fixture lookups hold the GIL and need no connection of their own, run them one after another
+		return {name: fn(*args) for name, (fn, args) in tasks.items()}
+
+	def fixture_work_order_items(self, work_orders):
+		return [frappe._dict(d) for name in work_orders for d in self.fixtures.work_order_items.get(name, [])]
+
+	def fixture_bom_items(self, bom_nos):
+		rows = []
+		for bom_no in bom_nos:
+			if self.filters.include_subassembly_raw_materials:
+				items = self.fixtures.explode(bom_no).items()
+			else:
+				items = [(d.item_code, d.qty_per_unit) for d in self.fixtures.bom_items.get(bom_no, [])]
+			rows.extend(
+				frappe._dict(
+					parent=bom_no, item_code=item_code, raw_material_name=item_code, required_qty_per_unit=qty
+				)
+				for item_code, qty in items
+			)
+		return rows
+
+	def fixture_item_defaults(self, item_codes):
+		return [
+			frappe._dict(self.fixtures.item_defaults[item_code])
+			for item_code in set(item_codes)
+			if item_code in self.fixtures.item_defaults
+		]
+
+	def fixture_bins(self, item_codes):
+		return [
+			frappe._dict(d)
+			for item_code in set(item_codes)
+			for d in self.fixtures.bins.get(item_code, [])
+			if self.warehouse_scope is None or d.warehouse in self.warehouse_scope
+		]
+
+	def fixture_purchases(self, item_codes):
+		return [
+			frappe._dict(d)
+			for item_code in set(item_codes)
+			for d in self.fixtures.purchases.get(item_code, [])
+		]
+
+
+@contextmanager
+def synthetic_mapper(fixtures, trace_memory):
+	"""Point the Material Request mapper at the synthetic report for one end-to-end call."""
+	original = material_request_mapper.ProductionPlanReport
+	reports = []
+
+	def make_report(filters):
+		reports.append(SyntheticProductionPlanReport(filters, fixtures, trace_memory))
+		return reports[-1]
+
+	material_request_mapper.ProductionPlanReport = make_report
+	try:
+		yield reports
+	finally:
+		material_request_mapper.ProductionPlanReport = original
+
+
+def measure_report(fixtures, filters, trace_memory=True):
+	report = SyntheticProductionPlanReport(filters, fixtures, trace_memory)
+	report.execute_report()
+
+	totals = report.instrumentation.get_totals()
+	return {
+		"stages": report.instrumentation.stages,
+		"seconds": totals["seconds"],
+		"queries": totals["queries"],
+		"rows_fetched": totals["rows"],
+		"peak_kb": totals["peak_kb"],
+		"result_rows": len(report.data),
+	}
+
+
+def measure_mapper(fixtures, filters, trace_memory=True):
+	with synthetic_mapper(fixtures, trace_memory) as reports:
+		started = time.perf_counter()
+		result = material_request_mapper.get_material_request_data_from_report(filters)
+		seconds = time.perf_counter() - started
+
+	totals = reports[0].instrumentation.get_totals()
+	return {
+		"seconds": seconds,
+		"queries": totals["queries"],
+		"rows_fetched": totals["rows"],
+		"peak_kb": totals["peak_kb"],
+		"items": len(result["items"]),
+	}
+
+
+def run(scale="1k", based_on=None, filters=None, repeat=1, seed=42, trace_memory=True, output=None):
+	"""
+	Benchmark every stage of the report and the mapper on synthetic data.
+	scale is one of SCALES or a number of order lines; based_on limits the run to one document type;
+	filters are added to the report filters (e.g. {"explode_multi_level": 1, "net_subassembly_stock": 1}).
+	The fastest of `repeat` runs is kept. With output, the result is also written there as JSON.
+	"""
+	lines = SCALES.get(scale) or int(scale)
+	fixtures = PlanFixtures(lines, seed=seed)
+
+	results = {}
+	for doctype in [based_on] if based_on else list(ORDER_BY):
+		report_filters = frappe._dict(
+			company=fixtures.company, based_on=doctype, order_by=ORDER_BY[doctype], **(filters or {})
+		)
+		# tracemalloc slows allocation down several times, so timings come from untraced runs
+		# and memory peaks from one extra traced run
+		result = min(
+			(measure_report(fixtures, report_filters, trace_memory=False) for _ in range(repeat)),
+			key=lambda d: d["seconds"],
+		)
+		result["mapper"] = min(
+			(measure_mapper(fixtures, report_filters, trace_memory=False) for _ in range(repeat)),
+			key=lambda d: d["seconds"],
+		)
+
+		if trace_memory:
+			traced = measure_report(fixtures, report_filters, trace_memory=True)
+			for stage, d in result["stages"].items():
+				d["peak_kb"] = traced["stages"].get(stage, {}).get("peak_kb")
+			result["peak_kb"] = traced["peak_kb"]
+			result["mapper"]["peak_kb"] = measure_mapper(fixtures, report_filters, trace_memory=True)[
+				"peak_kb"
+			]
+
+		results[doctype] = result
+
+	result = {
+		"scale": scale,
+		"lines": lines,
+		"seed": seed,
+		"filters": filters or {},
+		"trace_memory": trace_memory,
+		"results": results,
+	}
+
+	if output:
+		with open(output, "w") as f:
+			json.dump(result, f, indent=1, sort_keys=True, default=str)
+
+	return result
+
+
+def purchase_lookup(rows=(500, 2_000, 8_000), keys=20_000, seed=42, repeat=3):
+	"""
+	Row enrichment's arrival_date lookup against `keys` pending-PO (item_code, warehouse) keys,
+	for every row count in `rows`: the scan over every key that ran per row before the per-item
+	purchase index, and build_purchase_index plus one lookup per row (index build included).
+	Returns [ { rows, keys, scan_seconds, index_seconds, identical }, ... ]
+	"""
+	rng = random.Random(seed)
+	items = [f"RM-{i}" for i in range(keys // 4)]
+	base_date = datetime.date(2026, 1, 1)
+	purchase_details = {}
+	for i in range(keys):
+		purchase_details[(rng.choice(items), f"WH-{i % 40}")] = frappe._dict(
+			arrival_date=base_date + datetime.timedelta(days=rng.randint(0, 90)), arrival_qty=5.0
+		)
+
+	def scan(item_codes):
+		dates = []
+		for item_code in item_codes:
+			arrival_dates = [
+				d.arrival_date
+				for (it, _wh), d in purchase_details.items()
+				if it == item_code and d.arrival_date
+			]
+			dates.append(min(arrival_dates) if arrival_dates else None)
+		return dates
+
+	def index(item_codes):
+		report = ProductionPlanReport(frappe._dict())
+		report.purchase_details = purchase_details
+		report.build_purchase_index()
+		entries = [report.purchase_index.get(item_code) for item_code in item_codes]
+		return [entry.arrival_date if entry else None for entry in entries]
+
+	results = []
+	for count in rows:
+		item_codes = [rng.choice(items) for _ in range(count)]
+		timings = {}
+		for label, fn in (("scan", scan), ("index", index)):
+			best = None
+			for _ in range(repeat):
+				started = time.perf_counter()
+				dates = fn(item_codes)
+				seconds = time.perf_counter() - started
+				best = seconds if best is None else min(best, seconds)
+			timings[label] = (best, dates)
+
+		results.append(
+			{
+				"rows": count,
+				"keys": len(purchase_details),
+				"scan_seconds": timings["scan"][0],
+				"index_seconds": timings["index"][0],
+				"identical": timings["scan"][1] == timings["index"][1],
+			}
+		)
+
+	return results
+
+
+def compare(baseline, current, threshold=0.2):
+	"""
+	Differences between two run() results (dicts or JSON file paths): every stage, report total
+	and mapper figure that got worse by more than `threshold` (0.2 = 20%). Query counts and row
+	counts are compared exactly. Returns { regressions: [...], improvements: [...] }.
+	"""
+	baseline, current = _load(baseline), _load(current)
+	regressions, improvements = [], []
+
+	def check(label, old, new, exact=False):
+		if old is None or new is None:
+			return
+		if exact:
+			# more queries is a regression, a different row count means the plan itself changed
+			if old != new:
+				better = new < old and not label.endswith("result rows")
+				(improvements if better else regressions).append(f"{label}: {old} -> {new}")
+			return
+		if label.endswith("seconds") and max(old, new) < MIN_SECONDS:
+			return
+		change = (new - old) / old if old else 0
+		if abs(change) > threshold:
+			(regressions if change > 0 else improvements).append(
+				f"{label}: {old:.4g} -> {new:.4g} ({change:+.0%})"
+			)
+
+	for doctype, old in baseline["results"].items():
+		new = current["results"].get(doctype)
+		if not new:
+			continue
+
+		for stage, old_stage in old["stages"].items():
+			new_stage = new["stages"].get(stage, {})
+			check(f"{doctype} / {stage} seconds", old_stage["seconds"], new_stage.get("seconds"))
+			check(f"{doctype} / {stage} queries", old_stage["queries"], new_stage.get("queries"), exact=True)
+			check(f"{doctype} / {stage} rows fetched", old_stage["rows"], new_stage.get("rows"), exact=True)
+			check(f"{doctype} / {stage} peak_kb", old_stage["peak_kb"], new_stage.get("peak_kb"))
+
+		check(f"{doctype} / total seconds", old["seconds"], new["seconds"])
+		check(f"{doctype} / total queries", old["queries"], new["queries"], exact=True)
+		check(f"{doctype} / result rows", old["result_rows"], new["result_rows"], exact=True)
+		check(f"{doctype} / mapper seconds", old["mapper"]["seconds"], new["mapper"]["seconds"])
+		check(f"{doctype} / mapper queries", old["mapper"]["queries"], new["mapper"]["queries"], exact=True)
+		check(f"{doctype} / mapper peak_kb", old["mapper"]["peak_kb"], new["mapper"]["peak_kb"])
+
+	return {"regressions": regressions, "improvements": improvements}
+
+
+def _load(result):
+	if isinstance(result, str):
+		with open(result) as f:
+			return json.load(f)
+	return result
@@ -0,0 +1,151 @@
+import frappe
+from frappe.utils import flt
+
+from custom_reports.custom_stock_reports.utils import bulk_lookup
+
+
+class BOMExplosion:
+	"""
+	Multi-level BOM explosion for a set of BOMs.
+
+	- The BOM graph is loaded level by level: one BOM Item query per BOM depth, not per BOM
+	- per_unit(bom_no) is memoized, so a sub-assembly shared by many BOMs is expanded once per run
+	- explode(bom_no, qty) optionally nets available sub-assembly stock at every level before
+	  descending, consuming self.stock in call order (i.e. order priority)
+	"""
+
+	def __init__(self, bom_nos):
+		self.children = {}  # bom_no -> [ { item_code, item_name, bom_no, qty_per_unit }, ... ]
+		self.item_names = {}
+		self.stock = {}  # sub-assembly item_code -> qty still available for netting
+		self._per_unit = {}
+		self._subassembly_items = {}
+		self._expanding = set()
+		self.load(bom_nos)
+
+	def load(self, bom_nos):
+		bom = frappe.qb.DocType("BOM")
+		bom_item = frappe.qb.DocType("BOM Item")
+
+		frontier = {b for b in bom_nos if b}
+		while frontier:
+			rows = bulk_lookup.run_in(
+				lambda chunk: (
+					frappe.qb.from_(bom)
+					.from_(bom_item)
+					.select(
+						bom_item.parent,
+						bom_item.item_code,
+						bom_item.item_name,
+						bom_item.bom_no,
+						(bom_item.stock_qty / bom.quantity).as_("qty_per_unit"),
+					)
+					.where(
+						(bom_item.parent.isin(chunk)) & (bom_item.parent == bom.name) & (bom.docstatus == 1)
+					)
+				),
+				sorted(frontier),
+				as_dict=True,
+			)
+
+			for bom_no in frontier:
+				self.children.setdefault(bom_no, [])
+			for d in rows:
+				self.children[d.parent].append(d)
+				self.item_names.setdefault(d.item_code, d.item_name)
+
+			frontier = {d.bom_no for d in rows if d.bom_no} - set(self.children)
+
+	def is_subassembly(self, d):
+		return bool(d.bom_no) and d.bom_no in self.children and d.bom_no not in self._expanding
+
+	def subassembly_items(self):
+		return {d.item_code for rows in self.children.values() for d in rows if d.bom_no}
+
+	def load_stock(self, warehouses=None):
+		"""Available qty of every sub-assembly item, optionally limited to `warehouses`."""
+		items = self.subassembly_items()
+		if not items:
+			return
+
+		filters = {}
+		if warehouses is not None:
+			filters["warehouse"] = ("in", list(warehouses))
+
+		for d in bulk_lookup.get_all_in(
+			"Bin",
+			"item_code",
+			sorted(items),
+			fields=["item_code", "sum(actual_qty) as qty"],
+			filters=filters,
+			group_by="item_code",
+		):
+			self.stock[d.item_code] = flt(d.qty)
+
+	def per_unit(self, bom_no):
+		"""{ raw material item_code: qty per unit of bom_no }, fully exploded, no netting."""
+		if bom_no in self._per_unit:
+			return self._per_unit[bom_no]
+
+		self._expanding.add(bom_no)
+		requirements = {}
+		for d in self.children.get(bom_no, []):
+			if self.is_subassembly(d):
+				for item_code, qty in self.per_unit(d.bom_no).items():
+					requirements[item_code] = requirements.get(item_code, 0.0) + flt(d.qty_per_unit) * qty
+			else:
+				requirements[d.item_code] = requirements.get(d.item_code, 0.0) + flt(d.qty_per_unit)
+		self._expanding.discard(bom_no)
+
+		self._per_unit[bom_no] = requirements
+		return requirements
+
+	def _get_subassembly_items(self, bom_no):
+		"""Sub-assembly item codes anywhere below bom_no (memoized)."""
+		if bom_no not in self._subassembly_items:
+			self._expanding.add(bom_no)
+			items = set()
+			for d in self.children.get(bom_no, []):
+				if self.is_subassembly(d):
+					items.add(d.item_code)
+					items |= self._get_subassembly_items(d.bom_no)
+			self._expanding.discard(bom_no)
+			self._subassembly_items[bom_no] = items
+
+		return self._subassembly_items[bom_no]
+
+	def _has_stock_below(self, bom_no):
+		return any(self.stock.get(item_code, 0) > 0 for item_code in self._get_subassembly_items(bom_no))
+
+	def explode(self, bom_no, qty, requirements=None):
+		"""
+		Raw material requirements to make `qty` of `bom_no`, netting sub-assembly stock level by level.
+		Sub-trees without any remaining sub-assembly stock use the memoized per_unit vector.
+		"""
+		if requirements is None:
+			requirements = {}
+
+		self._expanding.add(bom_no)
+		for d in self.children.get(bom_no, []):
+			need = flt(qty) * flt(d.qty_per_unit)
+			if not self.is_subassembly(d):
+				requirements[d.item_code] = requirements.get(d.item_code, 0.0) + need
+				continue
+
+			available = self.stock.get(d.item_code, 0)
+			if available > 0:
+				used = min(available, need)
+				self.stock[d.item_code] = available - used
+				need -= used
+
+			if need <= 0:
+				continue
+
+			if self._has_stock_below(d.bom_no):
+				self.explode(d.bom_no, need, requirements)
+			else:
+				for item_code, per_unit in self.per_unit(d.bom_no).items():
+					requirements[item_code] = requirements.get(item_code, 0.0) + need * per_unit
+		self._expanding.discard(bom_no)
+
+		return requirements
@@ -0,0 +1,45 @@
+import frappe
+
+# keys per IN-list: statements stay small and every chunk is an index range lookup
+CHUNK_SIZE = 1000
+
+
+def unique(keys):
+	"""Distinct non-empty keys, in first-seen order."""
+	return list(dict.fromkeys(key for key in keys if key))
+
+
+def chunks(keys, size=CHUNK_SIZE):
+	keys = unique(keys)
+	for start in range(0, len(keys), size):
+		yield keys[start : start + size]
+
+
+def get_all_in(doctype, field, keys, filters=None, **kwargs):
+	"""
+	frappe.get_all with `field` IN keys, one query per chunk of distinct keys.
+	No keys means no query. Any group_by must include `field`, groups may not span chunks.
+	"""
+	rows = []
+	for chunk in chunks(keys):
+		rows.extend(frappe.get_all(doctype, filters={**(filters or {}), field: ("in", chunk)}, **kwargs))
+	return rows
+
+
+def sql_in(query, keys, params=None, param="keys", **kwargs):
+	"""
+	frappe.db.sql with %(param)s bound to one chunk of distinct keys at a time, results concatenated.
+	Only for queries whose rows (and GROUP BY groups) each belong to a single key.
+	"""
+	rows = []
+	for chunk in chunks(keys):
+		rows.extend(frappe.db.sql(query, {**(params or {}), param: tuple(chunk)}, **kwargs))
+	return rows
+
+
+def run_in(build_query, keys, **kwargs):
+	"""Query builder variant of sql_in: build_query(chunk) returns the query for one chunk of keys."""
+	rows = []
+	for chunk in chunks(keys):
+		rows.extend(build_query(chunk).run(**kwargs))
+	return rows
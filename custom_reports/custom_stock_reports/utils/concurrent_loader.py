@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+MAX_WORKERS = 4
+
+
+def run_concurrently(tasks, instrumentation=None, max_workers=MAX_WORKERS):
+	"""
+	Run independent loaders at the same time and return their results by name.
+
+	tasks: { name: (callable, args) }. Every worker thread opens its own connection to the
+	current site (frappe.local is per thread), runs one loader as the session user and closes
+	the connection again. Queries are counted on `instrumentation` like the ones of the main
+	thread. The first exception of any loader is raised here, after all loaders have finished.
+	"""
+	if not tasks:
+		return {}
+
+	site, sites_path, user = frappe.local.site, frappe.local.sites_path, frappe.session.user
+
+	def run(fn, args):
+		frappe.init(site=site, sites_path=sites_path)
+		try:
+			frappe.connect()
+			frappe.set_user(user)
+			if instrumentation:
+				with instrumentation.count_queries():
+					return fn(*args)
+			return fn(*args)
+		finally:
+			frappe.destroy()
+
+	with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+		futures = {name: executor.submit(run, fn, args) for name, (fn, args) in tasks.items()}
+
+	return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,324 @@
+import bisect
+import copy
+
+import frappe
+from frappe.utils import cint, flt, now
+
+from custom_reports.custom_stock_reports.utils import bulk_lookup, report_cache
+
+STATE_TTL = 24 * 60 * 60  # seconds a saved plan can be resumed from
+# filters that change how the report is run, not what it plans
+IGNORED_FILTERS = ("incremental", "run_in_background", "debug")
+
+
+class IncrementalPlanner:
+	"""
+	Re-plan from the last saved run instead of from scratch.
+
+	Allocation is a greedy walk over the orders in priority order, so a change can only alter
+	the plan from the first order it touches onwards. Each run saves its inputs (orders, BOM
+	items, item defaults, the Bin snapshot allocation started from) together with a per-order
+	log of the rows it emitted and every Bin it looked up. The next run:
+	- reloads only documents modified since the saved watermark (orders, BOMs, Items, Bins)
+	- finds the first order whose inputs or Bin lookups changed
+	- replays the logged consumption of the orders before it and keeps their rows
+	- allocates the remaining orders exactly like prepare_data
+	Pending PO quantities only enrich rows, they are re-aggregated on every run.
+
+	Runs without a deterministic order_by, with explode_multi_level or aggregate_demand, or whose
+	warehouse scope changed since the saved run fall back to a full run (which saves a fresh state).
+	"""
+
+	def __init__(self, report):
+		self.report = report
+		self.filters = report.filters
+		filters = {k: v for k, v in self.filters.items() if k not in IGNORED_FILTERS}
+		self.state_key = f"{report_cache.CACHE_PREFIX}:plan_state:{report_cache.get_cache_key(filters)}"
+
+	def run(self):
+		watermark = now()
+		state = frappe.cache().get_value(self.state_key)
+
+		if state and self.can_resume(state):
+			self.run_incremental(state)
+		else:
+			state = self.run_full()
+
+		state.watermark = watermark
+		frappe.cache().set_value(self.state_key, state, expires_in_sec=STATE_TTL)
+
+	def get_priority_key(self):
+		"""Sort key matching the ORDER BY of query_open_orders, None when the order is not deterministic."""
+		field = {
+			("Sales Order", "Delivery Date"): "delivery_date",
+			("Sales Order", "Total Amount"): "base_grand_total",
+			("Material Request", "Required Date"): "schedule_date",
+			("Work Order", "Planned Start Date"): "planned_start_date",
+		}.get((self.filters.based_on, self.filters.order_by))
+
+		if not field:
+			return None
+		if field == "base_grand_total":
+			return lambda d: -flt(d.base_grand_total)
+		# NULLs sort first in ascending order
+		return lambda d: (d.get(field) is not None, d.get(field))
+
+	def can_resume(self, state):
+		if (
+			cint(self.filters.explode_multi_level)
+			or cint(self.filters.aggregate_demand)
+			or not self.get_priority_key()
+		):
+			return False
+
+		report = self.report
+		report.warehouse_tree = report.get_warehouse_tree()
+		report.warehouse_scope = report.get_warehouse_scope()
+		report.mrp_warehouses = []
+		if self.filters.raw_material_warehouse:
+			report.mrp_warehouses = report.warehouse_tree.child_warehouses(
+				self.filters.raw_material_warehouse
+			)
+
+		return (
+			report.warehouse_scope == state.warehouse_scope and report.mrp_warehouses == state.mrp_warehouses
+		)
+
+	def run_full(self):
+		report = self.report
+		report.order_logs = []
+		report.run_stages(skip=("prepare_data", "get_columns"))
+
+		# allocation consumes bin_details and mutates raw material rows, keep the inputs as loaded
+		state = self.get_state(
+			raw_materials=copy.deepcopy(report.raw_materials_dict),
+			bins={key: frappe._dict(d) for key, d in report.bin_details.items()},
+		)
+
+		report.prepare_data()
+		report.get_columns()
+		return state
+
+	def get_state(self, raw_materials, bins):
+		report = self.report
+		return frappe._dict(
+			orders=report.orders,
+			raw_materials=raw_materials,
+			item_details=getattr(report, "item_details", {}),
+			bins=bins,
+			item_codes=list(dict.fromkeys(report.item_codes)),
+			warehouses=report.warehouses,
+			mrp_warehouses=getattr(report, "mrp_warehouses", []),
+			warehouse_scope=report.warehouse_scope,
+			rows=report.rows,
+			order_logs=report.order_logs,
+		)
+
+	def run_incremental(self, state):
+		report = self.report
+		report.orders = state.orders
+		report.raw_materials_dict = state.raw_materials
+		report.item_details = state.item_details
+		report.item_codes = list(state.item_codes)
+
+		self.progress("orders")
+		first = self.update_orders(state.watermark)
+
+		self.progress("raw_materials")
+		first = min(first, self.update_boms(state.watermark), self.update_item_details(state))
+
+		self.progress("bins")
+		first = min(first, self.update_bins(state))
+
+		self.rebuild_warehouses(state)
+		report.bin_details = {key: frappe._dict(d) for key, d in state.bins.items()}
+
+		self.progress("purchase_orders")
+		report.get_purchase_details()
+
+		self.progress("warehouses")
+		report.get_parent_warehouses()
+		report.build_parent_warehouse_data()
+
+		self.progress("prepare_data")
+		pristine = report.raw_materials_dict
+		report.raw_materials_dict = copy.deepcopy(pristine)
+		self.replay(state, first)
+		report.get_columns()
+
+		state.update(self.get_state(raw_materials=pristine, bins=state.bins))
+
+	def progress(self, stage):
+		if self.report.progress_callback:
+			stages = [name for name, _methods in self.report.STAGES]
+			self.report.progress_callback(stage, stages.index(stage), len(stages))
+		self.report.instrumentation.start(stage)
+
+	def update_orders(self, watermark):
+		"""
+		Replace the lines of orders modified since the last run, return the first index that changed.
+		Orders of production items modified since then are re-read too: lines without a bom_no
+		took the Item's default_bom, which may have changed.
+		"""
+		report = self.report
+		changed = frappe.get_all(self.filters.based_on, filters={"modified": (">", watermark)}, pluck="name")
+		if self.filters.based_on != "Work Order":
+			changed_items = set(
+				bulk_lookup.get_all_in(
+					"Item",
+					"name",
+					[d.production_item for d in report.orders],
+					filters={"modified": (">", watermark)},
+					pluck="name",
+				)
+			)
+			changed.extend(d.name for d in report.orders if d.production_item in changed_items)
+			changed = list(dict.fromkeys(changed))
+		if self.filters.docnames:
+			docnames = set(self.filters.docnames)
+			changed = [name for name in changed if name in docnames]
+		if not changed:
+			return len(report.orders)
+
+		old_orders = report.orders
+		changed_names = set(changed)
+		orders = [d for d in old_orders if d.name not in changed_names]
+		fresh = report.query_open_orders(changed)
+
+		if self.filters.based_on == "Work Order":
+			for name in changed:
+				report.raw_materials_dict.pop(name, None)
+			raw_materials = report.get_work_order_items([d.name for d in fresh]) if fresh else []
+		else:
+			report.resolve_default_boms(fresh)
+			bom_nos = list({d.bom_no for d in fresh if d.bom_no} - set(report.raw_materials_dict))
+			raw_materials = report.get_bom_items(bom_nos) if bom_nos else []
+
+		if raw_materials:
+			report.add_raw_materials(raw_materials)
+		report.item_codes.extend([d.production_item for d in fresh])
+
+		# insert after existing lines with the same priority, like a stable sort
+		priority_key = self.get_priority_key()
+		keys = [priority_key(d) for d in orders]
+		for d in fresh:
+			index = bisect.bisect_right(keys, priority_key(d))
+			keys.insert(index, priority_key(d))
+			orders.insert(index, d)
+
+		report.orders = orders
+		for index, (old, new) in enumerate(zip(old_orders, orders, strict=False)):
+			if old is not new:
+				return index
+		return min(len(old_orders), len(orders))
+
+	def update_boms(self, watermark):
+		report = self.report
+		if self.filters.based_on == "Work Order" or not report.raw_materials_dict:
+			return len(report.orders)
+
+		changed = bulk_lookup.get_all_in(
+			"BOM",
+			"name",
+			list(report.raw_materials_dict),
+			filters={"modified": (">", watermark)},
+			pluck="name",
+		)
+		if not changed:
+			return len(report.orders)
+
+		for bom_no in changed:
+			report.raw_materials_dict.pop(bom_no, None)
+		raw_materials = report.get_bom_items(changed)
+		if raw_materials:
+			report.add_raw_materials(raw_materials)
+
+		changed = set(changed)
+		return self.first_order(lambda d, key: key in changed)
+
+	def update_item_details(self, state):
+		"""Reload Item Defaults of changed items and load everything for items new to the plan."""
+		report = self.report
+		known = set(state.item_codes)
+		new_items = [item_code for item_code in dict.fromkeys(report.item_codes) if item_code not in known]
+
+		changed = bulk_lookup.get_all_in(
+			"Item", "name", known, filters={"modified": (">", state.watermark)}, pluck="name"
+		)
+
+		for item_code in changed:
+			report.item_details.pop(item_code, None)
+		if changed or new_items:
+			report.load_item_details(changed + new_items)
+
+		# new items come with new order lines, which are replanned already; bins are loaded for them here
+		if new_items:
+			for d in report.load_bins(new_items):
+				state.bins[(d.item_code, d.warehouse)] = d
+
+		if not changed:
+			return len(report.orders)
+
+		changed = set(changed)
+		return self.first_order(
+			lambda d, key: any(rm.item_code in changed for rm in report.raw_materials_dict.get(key) or [])
+		)
+
+	def update_bins(self, state):
+		"""Refresh the Bin snapshot, return the first order whose allocation looked at a changed Bin."""
+		report = self.report
+		changed = set()
+		for d in report.load_bins(state.item_codes, modified_after=state.watermark):
+			key = (d.item_code, d.warehouse)
+			state.bins[key] = d
+			changed.add(key)
+
+		if not changed:
+			return len(report.orders)
+
+		for index, log in enumerate(state.order_logs):
+			if any(key in changed for key, _qty in log.consumption):
+				return index
+		return len(report.orders)
+
+	def rebuild_warehouses(self, state):
+		"""Warehouses of the current orders and Bins, like get_raw_materials and get_bin_details collect them."""
+		report = self.report
+		warehouses = {d.warehouse for d in report.orders} | {
+			warehouse for _item_code, warehouse in state.bins
+		}
+		report.warehouses = list(warehouses | set(report.mrp_warehouses or []))
+
+	def first_order(self, is_affected):
+		for index, d in enumerate(self.report.orders):
+			key = d.name if self.filters.based_on == "Work Order" else d.bom_no
+			if is_affected(d, key):
+				return index
+		return len(self.report.orders)
+
+	def replay(self, state, first):
+		"""Keep the rows of orders before `first`, replaying their Bin consumption, and plan the rest."""
+		report = self.report
+		logs = state.order_logs[:first]
+
+		report.rows = state.rows[: logs[-1].stop if logs else 0]
+		report.order_logs = logs
+		report.allocator = None
+
+		for order, log in zip(report.orders, logs, strict=False):
+			for key, qty in log.consumption:
+				bin_data = report.bin_details.get(key)
+				if bin_data:
+					bin_data["actual_qty"] = bin_data.get("actual_qty", 0) - qty
+
+			for row, key in zip(report.rows[log.start : log.stop], log.row_keys, strict=True):
+				if key:
+					row.bin = report.bin_details.get(key)
+					row.purchase = report.purchase_details.get(key)
+
+			key = order.name if self.filters.based_on == "Work Order" else order.bom_no
+			if report.raw_materials_dict.get(key):
+				report.set_order_po_fields(order)
+
+		for order in report.orders[first:]:
+			report.prepare_order(order)
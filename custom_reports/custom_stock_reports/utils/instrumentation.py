@@ -0,0 +1,170 @@
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+LOG_DOCTYPE = "Production Plan Run Log"
+# runs slower than this are logged even without the debug filter;
+# override with "production_plan_slow_run_seconds" in site_config
+SLOW_RUN_SECONDS = 60
+
+
+class StageInstrumentation:
+	"""
+	Per-stage wall time, SQL query count, rows fetched and peak memory of one planning run.
+
+	- start(stage) closes the previous stage and opens the next one
+	- track() counts every frappe.db.sql call of the run and the rows it returned
+	- peak memory (tracemalloc) is only traced with trace_memory, it slows allocation down;
+	  the process' peak RSS is always recorded at the end of the run
+	"""
+
+	def __init__(self, trace_memory=False):
+		self.trace_memory = trace_memory
+		self.stages = {}  # stage -> { seconds, queries, rows, peak_kb }
+		self.queries = 0
+		self.rows = 0
+		self.current = None
+		self.started = None
+		self.seconds = 0.0
+		self.max_rss_kb = None
+		# queries can also be added from loader threads, see concurrent_loader
+		self._lock = threading.Lock()
+
+	def add_query(self, rows=0):
+		with self._lock:
+			self.queries += 1
+			self.rows += rows
+
+	@contextmanager
+	def count_queries(self):
+		"""Count frappe.db.sql calls on the current connection (each thread has its own)."""
+		db = getattr(frappe.local, "db", None)
+		if not db:
+			yield
+			return
+
+		previous_sql = db.__dict__.get("sql")
+		sql = db.sql
+
+		def counted_sql(*args, **kwargs):
+			result = sql(*args, **kwargs)
+			self.add_query(len(result) if isinstance(result, list | tuple) else 0)
+			return result
+
+		db.sql = counted_sql
+		try:
+			yield
+		finally:
+			if previous_sql:
+				db.sql = previous_sql
+			else:
+				del db.sql
+
+	@contextmanager
+	def track(self):
+		started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+		if started_tracing:
+			tracemalloc.start()
+
+		started = time.perf_counter()
+		try:
+			with self.count_queries():
+				yield self
+		finally:
+			self.stop()
+			self.seconds += time.perf_counter() - started
+			self.max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+			if started_tracing:
+				tracemalloc.stop()
+
+	def start(self, stage):
+		self.stop()
+		self.current = stage
+		self.started = (time.perf_counter(), self.queries, self.rows)
+		if self.trace_memory and tracemalloc.is_tracing():
+			tracemalloc.reset_peak()
+
+	def stop(self):
+		if not self.current:
+			return
+
+		started, queries, rows = self.started
+		stage = self.stages.setdefault(
+			self.current, {"seconds": 0.0, "queries": 0, "rows": 0, "peak_kb": None}
+		)
+		stage["seconds"] += time.perf_counter() - started
+		stage["queries"] += self.queries - queries
+		stage["rows"] += self.rows - rows
+		if self.trace_memory and tracemalloc.is_tracing():
+			stage["peak_kb"] = max(stage["peak_kb"] or 0, tracemalloc.get_traced_memory()[1] // 1024)
+		self.current = None
+
+	def get_totals(self):
+		peaks = [d["peak_kb"] for d in self.stages.values() if d["peak_kb"] is not None]
+		return {
+			"seconds": self.seconds or sum(d["seconds"] for d in self.stages.values()),
+			"queries": self.queries,
+			"rows": self.rows,
+			"peak_kb": max(peaks) if peaks else None,
+			"max_rss_kb": self.max_rss_kb,
+		}
+
+	def get_message(self):
+		"""HTML summary for the report message of a debug run."""
+		rows = "".join(
+			f"<tr><td>{frappe.bold(stage)}</td><td>{d['seconds']:.3f}</td><td>{d['queries']}</td>"
+			f"<td>{d['rows']}</td><td>{d['peak_kb'] if d['peak_kb'] is not None else ''}</td></tr>"
+			for stage, d in self.stages.items()
+		)
+		totals = self.get_totals()
+		return f"""
+			<table class="table table-bordered table-condensed">
+				<thead><tr>
+					<th>{_("Stage")}</th><th>{_("Seconds")}</th><th>{_("Queries")}</th>
+					<th>{_("Rows Fetched")}</th><th>{_("Peak Memory (KB)")}</th>
+				</tr></thead>
+				<tbody>{rows}</tbody>
+				<tfoot><tr>
+					<th>{_("Total")}</th><th>{totals["seconds"]:.3f}</th><th>{totals["queries"]}</th>
+					<th>{totals["rows"]}</th><th>{totals["peak_kb"] if totals["peak_kb"] is not None else ""}</th>
+				</tr></tfoot>
+			</table>
+		"""
+
+	def log(self, filters, result_rows, force=False):
+		"""
+		Write a Production Plan Run Log for debug runs and runs slower than the configured threshold.
+		Desk runs are read-only GET requests that never commit (and may read from a replica), so the
+		log goes through frappe's deferred insert queue, like frappe.log_error in read-only mode.
+		"""
+		totals = self.get_totals()
+		threshold = flt(frappe.conf.get("production_plan_slow_run_seconds") or SLOW_RUN_SECONDS)
+		if not (force or totals["seconds"] >= threshold):
+			return
+
+		try:
+			frappe.get_doc(
+				{
+					"doctype": LOG_DOCTYPE,
+					"user": frappe.session.user,
+					"based_on": filters.get("based_on"),
+					"report_filters": frappe.as_json(filters),
+					"total_seconds": totals["seconds"],
+					"query_count": totals["queries"],
+					"rows_fetched": totals["rows"],
+					"result_rows": cint(result_rows),
+					"peak_memory_kb": totals["peak_kb"] or 0,
+					"max_rss_kb": totals["max_rss_kb"] or 0,
+					"stages": frappe.as_json(self.stages),
+				}
+			).deferred_insert()
+		except Exception:
+			# never fail a report run because its statistics could not be stored
+			frappe.log_error("Production Plan Run Log")
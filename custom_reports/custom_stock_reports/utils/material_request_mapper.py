@@ -1,10 +1,39 @@
 import frappe, json
-from frappe.utils import flt, nowdate
+from frappe.utils import cint, flt, nowdate
 #from erpnext.manufacturing.report.production_planning_report.production_planning_report import execute as run_report
-from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import execute as run_report
+from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import ProductionPlanReport
+
+# Per-item decisions are only collected when debugging is switched on, either with
+# debug=1 on the call or "material_request_mapper_debug": 1 in site_config.
+# At most DEBUG_SAMPLE_SIZE items are kept; one Error Log is written per call.
+DEBUG_SAMPLE_SIZE = 200
+
+
+class MapperTrace:
+    def __init__(self, enabled=False, sample_size=DEBUG_SAMPLE_SIZE):
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self.items = []
+        self.rows = 0
+
+    def add(self, item_code, shortage):
+        self.rows += shortage.rows
+        if self.enabled and len(self.items) < self.sample_size:
+            self.items.append(
+                {"item_code": item_code, "qty": shortage.qty, "rows": shortage.rows, "warehouse": shortage.warehouse}
+            )
+
+    def flush(self, items):
+        summary = {"rows": self.rows, "items": len(items)}
+        frappe.logger("custom_reports").info({"material_request_mapper": summary})
+
+        if self.enabled:
+            summary["sample"] = self.items
+            frappe.log_error("Material Request Mapper Debug", frappe.as_json(summary))
+
 
 @frappe.whitelist()
-def get_material_request_data_from_report(filters=None):
+def get_material_request_data_from_report(filters=None, debug=0):
     # Accept string or dict
     if isinstance(filters, str):
         try:
@@ -14,52 +43,24 @@ def get_material_request_data_from_report(filters=None):
     filters = frappe._dict(filters or {})
     filters.pop("docnames", None)
 
-    columns, data = run_report(filters)
+    trace = MapperTrace(enabled=bool(cint(debug) or frappe.conf.get("material_request_mapper_debug")))
 
-    exclude_fields = {"required_qty", "available_qty", "arrival_qty", "balance_po_qty"}
-    wh_columns = [
-        (col.get("label"), col.get("fieldname"))
-        for col in (columns or [])
-        if col.get("fieldname") and col.get("fieldname").endswith("_qty") and col.get("fieldname") not in exclude_fields
-    ]
-
-    totals, best_wh = {}, {}
-
-    for row in (data or []):
-        item_code = row.get("item_code") or row.get("raw_material_code")
-        if not item_code:
-            continue
-
-        balance = flt(row.get("balance_po_qty") or 0)
-        frappe.log_error("Row Debug", f"{row.get('item_code') or row.get('raw_material_code')} => BalanceQty: {row.get('balance_po_qty')} | Parsed: {balance}")
-        if balance <= 0:
-            continue
-
-        totals[item_code] = totals.get(item_code, 0) + balance
-
-        picked_wh, picked_score = None, -1.0
-        for label, fieldname in wh_columns:
-            v = flt(row.get(fieldname) or 0)
-            if v > 0 and v > picked_score:
-                picked_score, picked_wh = v, label
-
-        if not picked_wh:
-            picked_wh = row.get("warehouse")
-
-        if picked_wh and ((item_code not in best_wh) or (picked_score > best_wh[item_code][1])):
-            best_wh[item_code] = (picked_wh, picked_score)
+    # lean shortage run: same allocation as the report, without display rows or columns
+    shortages = ProductionPlanReport(filters).get_shortages()
 
     items = []
-    for item_code, qty in totals.items():
-        if qty <= 0:
+    for item_code, shortage in shortages.items():
+        trace.add(item_code, shortage)
+        if shortage.qty <= 0:
             continue
-        wh = (best_wh.get(item_code) or (None, None))[0]
         items.append({
             "item_code": item_code,
-            "qty": qty,
-            "warehouse": wh,
+            "qty": shortage.qty,
+            "warehouse": shortage.warehouse,
             "schedule_date": filters.get("schedule_date") or nowdate(),
         })
 
+    trace.flush(items)
+
     return {"items": items}
 
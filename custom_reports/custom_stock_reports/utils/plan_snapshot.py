@@ -0,0 +1,284 @@
+import hashlib
+
+import frappe
+from frappe.utils import flt, now
+from redis.exceptions import ResponseError
+
+from custom_reports.custom_stock_reports.utils import bulk_lookup, report_cache
+from custom_reports.custom_stock_reports.utils.warehouse_tree import get_warehouse_tree
+
+SNAPSHOT_DOCTYPE = "Production Plan Stock Snapshot"
+# items waiting for a refresh, filled by doc_events and drained by refresh_pending_items
+PENDING_KEY = f"{report_cache.CACHE_PREFIX}:snapshot_pending"
+REFRESH_JOB_ID = "production_plan_stock_snapshot_refresh"
+CHUNK_SIZE = 500
+SNAPSHOT_FIELDS = (
+	"item_code",
+	"warehouse",
+	"parent_warehouse",
+	"company",
+	"has_bin",
+	"actual_qty",
+	"ordered_qty",
+	"projected_qty",
+	"pending_po_qty",
+	"arrival_date",
+)
+
+
+def get_snapshot(item_codes, warehouse_scope=None, company=None):
+	"""
+	Bin and pending-PO data of the items from the snapshot table, in one lookup on its item_code index
+	(per chunk of item codes, see bulk_lookup).
+	Returns (bins, purchased_items, parent_qty_map): bins and purchased_items shaped like
+	ProductionPlanReport.load_bins and load_purchase_details, and the Bin stock grouped by the stored
+	parent_warehouse, { parent_wh: { item_code: qty, ... }, ... } (a warehouse without a parent is its
+	own group). Bins are limited to the warehouse scope, pending quantities to the company.
+	"""
+	bins, purchases, parent_qty_map = [], {}, {}
+	if not item_codes:
+		return bins, [], parent_qty_map
+
+	for d in bulk_lookup.get_all_in(SNAPSHOT_DOCTYPE, "item_code", item_codes, fields=list(SNAPSHOT_FIELDS)):
+		if d.has_bin and (warehouse_scope is None or d.warehouse in warehouse_scope):
+			bins.append(
+				frappe._dict(
+					warehouse=d.warehouse,
+					item_code=d.item_code,
+					actual_qty=d.actual_qty,
+					ordered_qty=d.ordered_qty,
+					projected_qty=d.projected_qty,
+				)
+			)
+			parent_stock = parent_qty_map.setdefault(d.parent_warehouse or d.warehouse, {})
+			parent_stock[d.item_code] = parent_stock.get(d.item_code, 0) + flt(d.actual_qty)
+
+		if flt(d.pending_po_qty) <= 0 or (company and d.company != company):
+			continue
+
+		# a warehouse can receive from Purchase Orders of more than one company
+		key = (d.item_code, d.warehouse or None)
+		purchase = purchases.get(key)
+		if not purchase:
+			purchases[key] = frappe._dict(
+				item_code=d.item_code,
+				warehouse=key[1],
+				arrival_date=d.arrival_date,
+				arrival_qty=flt(d.pending_po_qty),
+			)
+			continue
+
+		purchase.arrival_qty += flt(d.pending_po_qty)
+		if d.arrival_date and (not purchase.arrival_date or d.arrival_date < purchase.arrival_date):
+			purchase.arrival_date = d.arrival_date
+
+	return bins, list(purchases.values()), parent_qty_map
+
+
+def compute_rows(item_codes):
+	"""
+	Snapshot rows of the items, one per (item_code, warehouse, company): the Bin quantities plus the
+	pending quantity and earliest schedule date of open submitted Purchase Orders. Bins take the
+	company of their warehouse, pending quantities the company of their Purchase Order; normally
+	both are the same and end up in one row.
+	"""
+	tree = get_warehouse_tree()
+	rows = {}
+
+	def get_row(item_code, warehouse, company):
+		key = (item_code, warehouse or "", company or "")
+		if key not in rows:
+			d = tree.get(warehouse)
+			rows[key] = frappe._dict(
+				item_code=item_code,
+				warehouse=warehouse or None,
+				parent_warehouse=d.parent_warehouse if d else None,
+				company=company or None,
+				has_bin=0,
+				actual_qty=0,
+				ordered_qty=0,
+				projected_qty=0,
+				pending_po_qty=0,
+				arrival_date=None,
+			)
+		return rows[key]
+
+	for d in frappe.get_all(
+		"Bin",
+		fields=["warehouse", "item_code", "actual_qty", "ordered_qty", "projected_qty"],
+		filters={"item_code": ("in", item_codes)},
+	):
+		warehouse = tree.get(d.warehouse)
+		row = get_row(d.item_code, d.warehouse, warehouse.company if warehouse else None)
+		row.update(
+			has_bin=1, actual_qty=d.actual_qty, ordered_qty=d.ordered_qty, projected_qty=d.projected_qty
+		)
+
+	for d in frappe.db.sql(
+		"""
+		SELECT poi.item_code, poi.warehouse, po.company,
+			MIN(poi.schedule_date) AS arrival_date, SUM(poi.qty - poi.received_qty) AS pending_po_qty
+		FROM `tabPurchase Order Item` poi
+		JOIN `tabPurchase Order` po ON po.name = poi.parent
+		WHERE po.docstatus = 1
+			AND po.status NOT IN ('Closed', 'Completed')
+			AND poi.qty > poi.received_qty
+			AND poi.item_code IN %(item_codes)s
+		GROUP BY poi.item_code, poi.warehouse, po.company
+		""",
+		{"item_codes": tuple(item_codes)},
+		as_dict=True,
+	):
+		row = get_row(d.item_code, d.warehouse, d.company)
+		row.update(pending_po_qty=d.pending_po_qty, arrival_date=d.arrival_date)
+
+	return list(rows.values())
+
+
+def get_snapshot_name(row):
+	key = "\n".join([row.item_code, row.warehouse or "", row.company or ""])
+	return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def refresh_items(item_codes):
+	"""Recompute the snapshot rows of the items, replacing whatever was stored for them."""
+	item_codes = sorted(bulk_lookup.unique(item_codes))
+	for chunk in bulk_lookup.chunks(item_codes, CHUNK_SIZE):
+		rows = compute_rows(chunk)
+		frappe.db.delete(SNAPSHOT_DOCTYPE, {"item_code": ("in", chunk)})
+		insert_rows(rows)
+
+	return len(item_codes)
+
+
+def insert_rows(rows):
+	if not rows:
+		return
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		SNAPSHOT_DOCTYPE,
+		fields=["name", "owner", "creation", "modified", "modified_by", *SNAPSHOT_FIELDS],
+		values=[
+			(
+				get_snapshot_name(row),
+				user,
+				timestamp,
+				timestamp,
+				user,
+				*(row[field] for field in SNAPSHOT_FIELDS),
+			)
+			for row in rows
+		],
+		# a rebuild and a refresh job can overlap, the rows of both come from committed data
+		ignore_duplicates=True,
+	)
+
+
+def rebuild():
+	"""Full rebuild: every item with a Bin or a pending Purchase Order line."""
+	item_codes = set(frappe.get_all("Bin", pluck="item_code", distinct=True))
+	item_codes.update(
+		frappe.db.sql_list(
+			"""
+			SELECT DISTINCT poi.item_code
+			FROM `tabPurchase Order Item` poi
+			JOIN `tabPurchase Order` po ON po.name = poi.parent
+			WHERE po.docstatus = 1 AND po.status NOT IN ('Closed', 'Completed') AND poi.qty > poi.received_qty
+			"""
+		)
+	)
+
+	frappe.db.delete(SNAPSHOT_DOCTYPE)
+	count = refresh_items(item_codes)
+	report_cache.invalidate()
+	return count
+
+
+def mark_items(doc, method=None):
+	"""
+	doc_events hook: queue the items of a Bin, Stock Ledger Entry, Purchase Order / Receipt /
+	Invoice or re-parented Warehouse for a snapshot refresh. Items are collected per transaction
+	and only queued once it is committed, so the refresh reads the Bin and Purchase Order
+	quantities ERPNext wrote in it; a 500 line Stock Entry queues its items in one go.
+	"""
+	if doc.doctype in ("Bin", "Stock Ledger Entry"):
+		item_codes = [doc.item_code]
+	elif doc.doctype == "Warehouse":
+		# only the stored parent_warehouse changes, and only when the warehouse moved in the tree
+		if method == "on_update" and not doc.has_value_changed("parent_warehouse"):
+			return
+		item_codes = frappe.get_all("Bin", filters={"warehouse": doc.name}, pluck="item_code")
+	else:
+		item_codes = [d.item_code for d in doc.get("items") or []]
+
+	item_codes = set(filter(None, item_codes))
+	if not item_codes:
+		return
+
+	marked = getattr(frappe.local, "plan_snapshot_items", None)
+	if marked is None:
+		marked = frappe.local.plan_snapshot_items = set()
+		# commit drops the rollback callbacks and rollback the commit ones, only one of them runs
+		frappe.db.after_commit.add(queue_marked_items)
+		frappe.db.after_rollback.add(clear_marked_items)
+	marked.update(item_codes)
+
+
+def queue_marked_items():
+	item_codes = clear_marked_items()
+	if item_codes:
+		frappe.cache().sadd(PENDING_KEY, *item_codes)
+		enqueue_refresh_job()
+
+
+def clear_marked_items():
+	item_codes = getattr(frappe.local, "plan_snapshot_items", None)
+	frappe.local.plan_snapshot_items = None
+	return item_codes
+
+
+def enqueue_refresh():
+	"""Scheduler hook: queue a refresh for items queued while a job was running."""
+	if frappe.cache().exists(PENDING_KEY):
+		enqueue_refresh_job()
+
+
+def enqueue_refresh_job():
+	"""Queue the refresh job unless it is queued or running already: there is only ever one refresh at a time."""
+	frappe.enqueue(
+		"custom_reports.custom_stock_reports.utils.plan_snapshot.refresh_pending_items",
+		queue="short",
+		job_id=REFRESH_JOB_ID,
+		deduplicate=True,
+	)
+
+
+def refresh_pending_items():
+	"""
+	Refresh every queued item. The pending set is renamed to a key of this job first, in one
+	atomic step: items marked while the refresh runs go into a new pending set for the next job
+	instead of being dropped with the ones refreshed here.
+	"""
+	cache = frappe.cache()
+	processing_key = f"{PENDING_KEY}:{frappe.generate_hash(length=10)}"
+	try:
+		cache.rename(cache.make_key(PENDING_KEY), cache.make_key(processing_key))
+	except ResponseError:
+		# no pending items
+		return
+
+	item_codes = [frappe.safe_decode(item_code) for item_code in cache.smembers(processing_key)]
+	try:
+		refresh_items(item_codes)
+		frappe.db.commit()
+	except Exception:
+		frappe.db.rollback()
+		# keep them for the next job
+		cache.sadd(PENDING_KEY, *item_codes)
+		raise
+	finally:
+		cache.delete_value(processing_key)
+
+	# plans cached between the stock movement and this refresh were built from the old snapshot
+	report_cache.rotate_generation()
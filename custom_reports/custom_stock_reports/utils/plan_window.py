@@ -0,0 +1,137 @@
+import copy
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from custom_reports.custom_stock_reports.utils import report_cache
+
+REPORT_NAME = "Custom Production Planning Report"
+PAGE_LENGTH = 500
+# filters that only change which rows are shown, the plan itself is shared between views
+VIEW_FILTERS = ("paginate", "shortage_only", "sort_by", "sort_order")
+SORT_FIELDS = {
+	"Required Qty": "required_qty",
+	"Balance Qty": "balance_po_qty",
+	"Raw Material Code": "item_code",
+	"Item Code": "production_item",
+	"Order": "name",
+}
+SUMMARY_FIELDS = [("required_qty", "Required Qty"), ("balance_po_qty", "Balance Qty")]
+
+
+def has_view(filters):
+	# the filter UI always sends sort_order with its default, it only means something with a sort_by
+	return any(filters.get(key) for key in VIEW_FILTERS if key != "sort_order")
+
+
+def get_plan_filters(filters):
+	return frappe._dict({k: v for k, v in filters.items() if k not in VIEW_FILTERS})
+
+
+def execute(filters):
+	"""
+	execute() for shortage-only / sorted / paginated views. The complete plan stays in the
+	result cache; only the rows of the view (or its first window when paginating) are returned,
+	with the view's row count and totals as report summary.
+	"""
+	columns, data = get_plan(filters)
+	view = get_view(filters, data)
+
+	indices = view["indices"]
+	message = None
+	if cint(filters.paginate) and len(indices) > PAGE_LENGTH:
+		indices = indices[:PAGE_LENGTH]
+		message = _("Showing the first {0} of {1} rows, use Load More Rows for the next ones.").format(
+			PAGE_LENGTH, len(view["indices"])
+		)
+
+	rows = copy.deepcopy([data[i] for i in indices])
+	return columns, rows, message, None, get_report_summary(view)
+
+
+def get_plan(filters):
+	"""Full (columns, data) of the plan behind a view, computed once and served from the result cache."""
+	plan_filters = get_plan_filters(filters)
+	result = report_cache.get_cached_result(plan_filters, copy_result=False)
+	if result is None:
+		from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import (
+			ProductionPlanReport,
+		)
+
+		result = ProductionPlanReport(plan_filters).execute_report()
+		report_cache.set_cached_result(plan_filters, result)
+
+	return result
+
+
+def get_view(filters, data):
+	"""
+	Row indices of the view in display order plus its totals:
+	{ indices: [...], totals: { fieldname: sum } }, cached alongside the plan.
+	"""
+	view_filters = {k: v for k, v in filters.items() if k != "paginate"}
+	cache_key = f"{report_cache.CACHE_PREFIX}:view:{report_cache.get_generation()}:{report_cache.get_cache_key(view_filters)}"
+	view = frappe.cache().get_value(cache_key)
+	if view is not None and len(data) == view["plan_length"]:
+		return view
+
+	indices = range(len(data))
+	if cint(filters.shortage_only):
+		indices = [i for i in indices if flt(data[i].get("balance_po_qty")) > 0]
+
+	sort_field = SORT_FIELDS.get(filters.sort_by)
+	if sort_field:
+		# rows without a value (e.g. production_item on the second row of an order) go last
+		filled = [i for i in indices if data[i].get(sort_field) not in (None, "")]
+		empty = [i for i in indices if data[i].get(sort_field) in (None, "")]
+		indices = sorted(
+			filled, key=lambda i: data[i].get(sort_field), reverse=filters.sort_order == "Descending"
+		)
+		indices += empty
+
+	view = {
+		"indices": list(indices),
+		"plan_length": len(data),
+		"totals": {
+			fieldname: sum(flt(data[i].get(fieldname)) for i in indices)
+			for fieldname, _label in SUMMARY_FIELDS
+		},
+	}
+	frappe.cache().set_value(cache_key, view, expires_in_sec=report_cache.CACHE_TTL)
+	return view
+
+
+def get_report_summary(view):
+	summary = [{"value": len(view["indices"]), "label": _("Rows"), "datatype": "Int"}]
+	for fieldname, label in SUMMARY_FIELDS:
+		value = view["totals"][fieldname]
+		summary.append(
+			{
+				"value": value,
+				"label": _(label),
+				"datatype": "Float",
+				"indicator": "Red" if fieldname == "balance_po_qty" and value > 0 else "Blue",
+			}
+		)
+	return summary
+
+
+@frappe.whitelist()
+def get_plan_window(filters, start=0, page_length=PAGE_LENGTH):
+	"""One window of a view, for paginated runs; rows are computed and kept on the server."""
+	if not frappe.get_doc("Report", REPORT_NAME).is_permitted():
+		frappe.throw(_("You don't have access to Report: {0}").format(REPORT_NAME), frappe.PermissionError)
+
+	filters = frappe._dict(frappe.parse_json(filters))
+	start, page_length = cint(start), cint(page_length)
+
+	_columns, data = get_plan(filters)
+	view = get_view(filters, data)
+	indices = view["indices"][start : start + page_length]
+
+	return {
+		"result": [data[i] for i in indices],
+		"total": len(view["indices"]),
+		"totals": view["totals"],
+	}
@@ -0,0 +1,103 @@
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+import frappe
+
+# Results are cached in two layers:
+# - a small per-process LRU so repeated opens on the same worker skip Redis entirely
+# - Redis (frappe.cache) so every worker shares the same results
+# Both layers expire entries after CACHE_TTL, some changes (e.g. db_set status updates) never reach
+# the invalidation hooks. Every key embeds a generation token; invalidation just rotates the token,
+# and the language, column labels are translated.
+CACHE_PREFIX = "custom_production_planning_report"
+GENERATION_KEY = f"{CACHE_PREFIX}:generation"
+CACHE_TTL = 300  # seconds
+# the per-process LRU is bounded by plan rows, not entries: each worker keeps at most this many
+# rows in total, and larger plans are only cached in Redis
+LOCAL_CACHE_ROWS = 20_000
+
+_local_cache = OrderedDict()
+
+
+def get_cache_key(filters):
+	"""Canonical hash of the report filters (empty values dropped, lists sorted)."""
+	normalized = {}
+	for key, value in (filters or {}).items():
+		if value in (None, "", [], 0, "0"):
+			continue
+		if isinstance(value, list | tuple | set):
+			value = sorted(value)
+		normalized[key] = value
+
+	payload = json.dumps(normalized, sort_keys=True, default=str)
+	return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_generation():
+	generation = frappe.cache().get_value(GENERATION_KEY)
+	if not generation:
+		generation = frappe.generate_hash(length=10)
+		frappe.cache().set_value(GENERATION_KEY, generation)
+	return generation
+
+
+def get_cached_result(filters, copy_result=True):
+	"""
+	Return cached (columns, data) for the filters or None.
+	Read-only callers can pass copy_result=False to skip copying the whole plan.
+	"""
+	key = get_result_key(filters)
+
+	# entries are (expires_at, result), the local copy expires together with the Redis one
+	entry = _local_cache.pop(key, None)
+	if entry is None:
+		entry = frappe.cache().get_value(key)
+	if entry is None or entry[0] <= time.time():
+		return None
+
+	_set_local(key, entry)
+	result = entry[1]
+	return copy.deepcopy(result) if copy_result else result
+
+
+def set_cached_result(filters, result):
+	key = get_result_key(filters)
+	expires_at = time.time() + CACHE_TTL
+	frappe.cache().set_value(key, (expires_at, result), expires_in_sec=CACHE_TTL)
+	_set_local(key, (expires_at, copy.deepcopy(result)))
+
+
+def get_result_key(filters):
+	return f"{CACHE_PREFIX}:{get_generation()}:{frappe.local.lang}:{get_cache_key(filters)}"
+
+
+def _set_local(key, entry):
+	if get_result_rows(entry[1]) > LOCAL_CACHE_ROWS:
+		return
+
+	_local_cache[key] = entry
+	_local_cache.move_to_end(key)
+	while sum(get_result_rows(cached) for _expires_at, cached in _local_cache.values()) > LOCAL_CACHE_ROWS:
+		_local_cache.popitem(last=False)
+
+
+def get_result_rows(result):
+	"""Approximate size of a cached (columns, data) result."""
+	return len(result[1] or [])
+
+
+def invalidate(doc=None, method=None):
+	"""
+	doc_events hook: stock or order changed, drop every cached plan once the change is committed.
+	Rotating earlier would let a run in between (e.g. before ERPNext updated the Bin of a
+	Stock Ledger Entry) cache the old stock under the new generation.
+	"""
+	frappe.db.after_commit.add(rotate_generation)
+
+
+def rotate_generation():
+	frappe.cache().set_value(GENERATION_KEY, frappe.generate_hash(length=10))
+	_local_cache.clear()
@@ -0,0 +1,164 @@
+import frappe
+from frappe.query_builder.terms import NamedParameterWrapper
+
+# row kinds of the combined result, see load
+KINDS = ("default_bom", "raw_material", "item_default", "bin", "purchase")
+
+
+def load(report):
+	"""
+	Everything get_raw_materials, get_item_details, get_bin_details and get_purchase_details load
+	after the orders, in one statement. The open-order query of the report becomes a CTE, BOM /
+	Work Order items, the items involved, Bins, Item Defaults and the pending-PO aggregation are
+	derived from it on the server, and the rows come back as one UNION ALL tagged by kind.
+	Rows are normalized (one per BOM item, Bin or PO group), not the order x raw material x Bin
+	product, so nothing is sent twice.
+	Returns { default_boms: { item_code: default_bom }, raw_materials, item_details, bins, purchases },
+	the lists shaped like the rows of the matching report loaders.
+	"""
+	query, params = build_query(report)
+	rows = {kind: [] for kind in KINDS}
+	for d in frappe.db.sql(query, params, as_dict=True):
+		rows[d.kind].append(d)
+
+	# the Bin / Item Default / PO order never mattered, BOM lines keep their position in the BOM
+	rows["raw_material"].sort(key=lambda d: (d.parent, d.idx or 0))
+	return {
+		"default_boms": {d.item_code: d.label for d in rows["default_bom"]},
+		"raw_materials": [get_raw_material(report, d) for d in rows["raw_material"]],
+		"item_details": [
+			frappe._dict(parent=d.item_code, default_warehouse=d.warehouse) for d in rows["item_default"]
+		],
+		"bins": [
+			frappe._dict(
+				warehouse=d.warehouse,
+				item_code=d.item_code,
+				actual_qty=d.qty,
+				ordered_qty=d.ordered_qty,
+				projected_qty=d.projected_qty,
+			)
+			for d in rows["bin"]
+		],
+		"purchases": [
+			frappe._dict(
+				item_code=d.item_code, warehouse=d.warehouse, arrival_date=d.arrival_date, arrival_qty=d.qty
+			)
+			for d in rows["purchase"]
+		],
+	}
+
+
+def get_raw_material(report, d):
+	if report.filters.based_on == "Work Order":
+		return frappe._dict(
+			parent=d.parent,
+			item_code=d.item_code,
+			raw_material_name=d.label,
+			warehouse=d.warehouse,
+			required_qty=d.qty,
+		)
+	return frappe._dict(
+		parent=d.parent, item_code=d.item_code, raw_material_name=d.label, required_qty_per_unit=d.qty
+	)
+
+
+def build_query(report):
+	filters = report.filters
+	param_wrapper = NamedParameterWrapper()
+	orders_sql = report.build_open_orders_query(filters.docnames).get_sql(param_wrapper=param_wrapper)
+	params = param_wrapper.get_parameters()
+
+	if filters.based_on == "Work Order":
+		demand_ctes = """
+			raw_materials AS (
+				SELECT woi.parent, woi.item_code, woi.item_name, woi.source_warehouse AS warehouse,
+					woi.required_qty AS qty, woi.idx
+				FROM `tabWork Order Item` woi
+				WHERE woi.parent IN (SELECT name FROM orders)
+					AND woi.docstatus = 1
+					AND IFNULL(woi.source_warehouse, '') != ''
+			)"""
+		default_boms = ""
+	else:
+		bom_item_doctype = "BOM Explosion Item" if filters.include_subassembly_raw_materials else "BOM Item"
+		if filters.include_subassembly_raw_materials:
+			qty_field = "bom_item.qty_consumed_per_unit"
+		else:
+			qty_field = "bom_item.qty / bom.quantity"
+		demand_ctes = f"""
+			boms AS (
+				SELECT DISTINCT COALESCE(NULLIF(o.bom_no, ''), item.default_bom) AS bom_no
+				FROM orders o
+				LEFT JOIN `tabItem` item ON item.name = o.production_item
+			),
+			raw_materials AS (
+				SELECT bom_item.parent, bom_item.item_code, bom_item.item_name, NULL AS warehouse,
+					{qty_field} AS qty, bom_item.idx
+				FROM `tab{bom_item_doctype}` bom_item
+				JOIN `tabBOM` bom ON bom.name = bom_item.parent
+				WHERE bom_item.parent IN (SELECT bom_no FROM boms)
+					AND bom.docstatus = 1
+			)"""
+		default_boms = """
+		UNION ALL
+		SELECT 'default_bom', NULL, item.name, item.default_bom, NULL, NULL, NULL, NULL, NULL, NULL
+		FROM `tabItem` item
+		WHERE item.name IN (SELECT production_item FROM orders WHERE IFNULL(bom_no, '') = '')"""
+
+	bin_conditions = ""
+	if report.warehouse_scope is not None:
+		bin_conditions = "AND bin.warehouse IN %(warehouse_scope)s"
+		# an empty scope matches no Bin, IN () is not valid SQL
+		params["warehouse_scope"] = tuple(sorted(report.warehouse_scope)) or ("",)
+
+	# same conditions as load_item_details and load_purchase_details
+	item_default_condition = "IFNULL(item_default.company, '') = ''"
+	po_conditions = [
+		"po.docstatus = 1",
+		"po.status NOT IN ('Closed', 'Completed')",
+		"poi.qty > poi.received_qty",
+	]
+	if filters.get("company"):
+		item_default_condition = "item_default.company = %(company)s"
+		po_conditions.append("po.company = %(company)s")
+		params["company"] = filters.get("company")
+	if filters.get("from_date"):
+		po_conditions.append("po.transaction_date >= %(from_date)s")
+		params["from_date"] = filters.get("from_date")
+	if filters.get("to_date"):
+		po_conditions.append("po.transaction_date <= %(to_date)s")
+		params["to_date"] = filters.get("to_date")
+	po_condition_sql = " AND ".join(po_conditions)
+
+	query = f"""
+		WITH orders AS ({orders_sql}),
+			{demand_ctes},
+			items AS (
+				SELECT production_item AS item_code FROM orders
+				UNION
+				SELECT item_code FROM raw_materials
+			)
+		SELECT 'raw_material' AS kind, parent, item_code, item_name AS label, warehouse, qty,
+			NULL AS ordered_qty, NULL AS projected_qty, NULL AS arrival_date, idx
+		FROM raw_materials{default_boms}
+		UNION ALL
+		SELECT 'item_default', NULL, item_default.parent, NULL, item_default.default_warehouse,
+			NULL, NULL, NULL, NULL, NULL
+		FROM `tabItem Default` item_default
+		WHERE item_default.parent IN (SELECT item_code FROM items)
+			AND {item_default_condition}
+		UNION ALL
+		SELECT 'bin', NULL, bin.item_code, NULL, bin.warehouse, bin.actual_qty,
+			bin.ordered_qty, bin.projected_qty, NULL, NULL
+		FROM `tabBin` bin
+		WHERE bin.item_code IN (SELECT item_code FROM items) {bin_conditions}
+		UNION ALL
+		SELECT 'purchase', NULL, poi.item_code, NULL, poi.warehouse, SUM(poi.qty - poi.received_qty),
+			NULL, NULL, MIN(poi.schedule_date), NULL
+		FROM `tabPurchase Order Item` poi
+		JOIN `tabPurchase Order` po ON po.name = poi.parent
+		WHERE poi.item_code IN (SELECT item_code FROM items)
+			AND {po_condition_sql}
+		GROUP BY poi.item_code, poi.warehouse
+	"""
+	return query, params
@@ -0,0 +1,96 @@
+import copy
+import random
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from custom_reports.custom_stock_reports.report.custom_production_planning_report.custom_production_planning_report import (
+	ProductionPlanReport,
+)
+
+CASES = 3000
+WAREHOUSES = ("_Test Stores A", "_Test Stores B", "_Test Stores C")
+
+
+def make_plan(rng):
+	"""
+	Random in-memory plan: a few finished goods with BOMs of shared raw materials, Sales Order
+	lines competing for the same Bins, Item Defaults for some raw materials and Bins with
+	positive, zero and negative stock.
+	"""
+	raw_materials = [f"_Test RM {i}" for i in range(rng.randint(1, 6))]
+	finished_goods = [f"_Test FG {i}" for i in range(rng.randint(1, 3))]
+
+	def stock():
+		return rng.choice((0.0, -rng.uniform(0, 20), rng.uniform(0, 60), float(rng.randint(0, 40))))
+
+	bins = {}
+	for item_code in raw_materials + finished_goods:
+		for warehouse in rng.sample(WAREHOUSES, rng.randint(0, len(WAREHOUSES))):
+			bins[(item_code, warehouse)] = frappe._dict(
+				item_code=item_code,
+				warehouse=warehouse,
+				actual_qty=stock(),
+				ordered_qty=0.0,
+				projected_qty=0.0,
+			)
+
+	bom_items = {}
+	for item_code in finished_goods:
+		bom_items[f"BOM-{item_code}"] = [
+			frappe._dict(
+				parent=f"BOM-{item_code}",
+				item_code=rm,
+				raw_material_name=rm,
+				required_qty_per_unit=rng.choice((1.0, rng.uniform(0.1, 5))),
+			)
+			for rm in rng.sample(raw_materials, rng.randint(1, len(raw_materials)))
+		]
+
+	orders = []
+	for i in range(rng.randint(1, 12)):
+		item_code = rng.choice(finished_goods)
+		orders.append(
+			frappe._dict(
+				name=f"_Test SO {i}",
+				production_item=item_code,
+				production_item_name=item_code,
+				bom_no=f"BOM-{item_code}",
+				warehouse=rng.choice(WAREHOUSES),
+				qty_to_manufacture=float(rng.randint(1, 20)),
+			)
+		)
+
+	item_details = {
+		item_code: frappe._dict(parent=item_code, default_warehouse=rng.choice(WAREHOUSES))
+		for item_code in raw_materials
+		if rng.random() < 0.6
+	}
+	return frappe._dict(orders=orders, bom_items=bom_items, bins=bins, item_details=item_details)
+
+
+def run_plan(plan, **filters):
+	"""prepare_data on a copy of the plan; returns the display rows, final Bin stock and order availability."""
+	report = ProductionPlanReport(frappe._dict(based_on="Sales Order", **filters))
+	report.orders = copy.deepcopy(plan.orders)
+	report.raw_materials_dict = copy.deepcopy(plan.bom_items)
+	report.bin_details = copy.deepcopy(plan.bins)
+	report.item_details = plan.item_details
+	report.mrp_warehouses = []
+	report.parent_warehouses = []
+	report.prepare_data()
+
+	return (
+		[row.as_dict(report) for row in report.rows],
+		{key: d.actual_qty for key, d in report.bin_details.items()},
+		[order.get("available_qty") for order in report.orders],
+	)
+
+
+class TestAllocation(FrappeTestCase):
+	def test_batch_allocation_matches_sequential(self):
+		rng = random.Random(13)
+		for case in range(CASES):
+			plan = make_plan(rng)
+			with self.subTest(case=case):
+				self.assertEqual(run_plan(plan, batch_allocation=1), run_plan(plan))
@@ -0,0 +1,95 @@
+import frappe
+
+from custom_reports.custom_stock_reports.utils import report_cache
+
+# one tree per (site, tree generation) and process. The tree has a generation of its own, only
+# Warehouse changes rotate it: the report cache generation turns over with every stock movement.
+TREE_GENERATION_KEY = f"{report_cache.CACHE_PREFIX}:warehouse_tree_generation"
+_trees = {}
+
+
+def get_warehouse_tree():
+	key = (frappe.local.site, get_tree_generation())
+	tree = _trees.get(key)
+	if not tree:
+		_trees.clear()
+		tree = _trees[key] = WarehouseTree()
+	return tree
+
+
+def get_tree_generation():
+	generation = frappe.cache().get_value(TREE_GENERATION_KEY)
+	if not generation:
+		generation = frappe.generate_hash(length=10)
+		frappe.cache().set_value(TREE_GENERATION_KEY, generation)
+	return generation
+
+
+def invalidate(doc=None, method=None):
+	"""Warehouse doc_events hook: reload the tree everywhere once the change is committed."""
+	frappe.db.after_commit.add(rotate_tree_generation)
+
+
+def rotate_tree_generation():
+	frappe.cache().set_value(TREE_GENERATION_KEY, frappe.generate_hash(length=10))
+	_trees.clear()
+
+
+class WarehouseTree:
+	"""
+	In-memory Warehouse nested set, loaded with a single query.
+	Answers parent / children / descendant / ancestor lookups without further DB calls.
+	"""
+
+	def __init__(self, warehouses=None):
+		if warehouses is None:
+			warehouses = frappe.get_all(
+				"Warehouse",
+				fields=["name", "parent_warehouse", "lft", "rgt", "is_group", "company"],
+				order_by="lft asc",
+			)
+
+		self.warehouses = sorted(warehouses, key=lambda d: d.lft or 0)
+		self.by_name = {d.name: d for d in self.warehouses}
+		self.position = {d.name: i for i, d in enumerate(self.warehouses)}
+		self.children_map = {}
+		for d in self.warehouses:
+			if d.parent_warehouse:
+				self.children_map.setdefault(d.parent_warehouse, []).append(d.name)
+
+	def get(self, warehouse):
+		return self.by_name.get(warehouse)
+
+	def parent(self, warehouse):
+		d = self.by_name.get(warehouse)
+		return d.parent_warehouse if d else None
+
+	def children(self, warehouse):
+		"""Direct children, in lft order."""
+		return self.children_map.get(warehouse, [])
+
+	def descendants(self, warehouse):
+		"""All warehouses below `warehouse`, in lft order (contiguous in the nested set)."""
+		d = self.by_name.get(warehouse)
+		if not d:
+			return []
+
+		descendants = []
+		for child in self.warehouses[self.position[warehouse] + 1 :]:
+			if child.lft >= d.rgt:
+				break
+			descendants.append(child.name)
+		return descendants
+
+	def child_warehouses(self, warehouse):
+		"""Same result as erpnext's get_child_warehouses: descendants in lft order, then the warehouse itself."""
+		return [*self.descendants(warehouse), warehouse]
+
+	def ancestors(self, warehouse):
+		"""Parents of `warehouse`, nearest first."""
+		ancestors = []
+		parent = self.parent(warehouse)
+		while parent and parent not in ancestors:
+			ancestors.append(parent)
+			parent = self.parent(parent)
+		return ancestors
@@ -145,9 +145,83 @@ required_apps = ["erpnext"]
 # 	}
 # }
 
+# Invalidate cached Production Planning results whenever stock, orders or BOMs move
+_invalidate_plan_cache = "custom_reports.custom_stock_reports.utils.report_cache.invalidate"
+# queue the items of stock and purchase movements for a Production Plan Stock Snapshot refresh
+_refresh_stock_snapshot = "custom_reports.custom_stock_reports.utils.plan_snapshot.mark_items"
+# reload the cached warehouse tree, which has a generation of its own
+_invalidate_warehouse_tree = "custom_reports.custom_stock_reports.utils.warehouse_tree.invalidate"
+
+doc_events = {
+    "Bin": {
+        "on_update": [_invalidate_plan_cache, _refresh_stock_snapshot],
+    },
+    "Warehouse": {
+        "on_update": [_invalidate_warehouse_tree, _invalidate_plan_cache, _refresh_stock_snapshot],
+        "after_rename": [_invalidate_warehouse_tree, _invalidate_plan_cache, _refresh_stock_snapshot],
+        "on_trash": [_invalidate_warehouse_tree, _invalidate_plan_cache],
+    },
+    # Bin quantities are mostly written via db.set_value, so follow the ledger as well
+    "Stock Ledger Entry": {
+        "on_submit": [_invalidate_plan_cache, _refresh_stock_snapshot],
+        "on_cancel": [_invalidate_plan_cache, _refresh_stock_snapshot],
+    },
+    "Purchase Order": {
+        "on_submit": [_invalidate_plan_cache, _refresh_stock_snapshot],
+        "on_cancel": [_invalidate_plan_cache, _refresh_stock_snapshot],
+        "on_update_after_submit": [_invalidate_plan_cache, _refresh_stock_snapshot],
+    },
+    # receipts update received_qty of the Purchase Order lines
+    "Purchase Receipt": {
+        "on_submit": _refresh_stock_snapshot,
+        "on_cancel": _refresh_stock_snapshot,
+    },
+    "Purchase Invoice": {
+        "on_submit": _refresh_stock_snapshot,
+        "on_cancel": _refresh_stock_snapshot,
+    },
+    "Sales Order": {
+        "on_submit": _invalidate_plan_cache,
+        "on_cancel": _invalidate_plan_cache,
+        "on_update_after_submit": _invalidate_plan_cache,
+    },
+    "Work Order": {
+        "on_submit": _invalidate_plan_cache,
+        "on_cancel": _invalidate_plan_cache,
+        "on_update_after_submit": _invalidate_plan_cache,
+    },
+    "Material Request": {
+        "on_submit": _invalidate_plan_cache,
+        "on_cancel": _invalidate_plan_cache,
+        "on_update_after_submit": _invalidate_plan_cache,
+    },
+    "BOM": {
+        "on_submit": _invalidate_plan_cache,
+        "on_cancel": _invalidate_plan_cache,
+        "on_update_after_submit": _invalidate_plan_cache,
+    },
+}
+
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+    # items queued while a snapshot refresh job was already running
+    "all": [
+        "custom_reports.custom_stock_reports.utils.plan_snapshot.enqueue_refresh",
+    ],
+    # Purchase Order status changes (Close / Hold) are written without document events
+    "daily": [
+        "custom_reports.custom_stock_reports.utils.plan_snapshot.rebuild",
+    ],
+    # morning planning batch configured as "production_plan_batch" in site_config
+    "cron": {
+        "0 6 * * *": [
+            "custom_reports.custom_stock_reports.utils.batch_planning.run_scheduled_batch",
+        ],
+    },
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"custom_reports.tasks.all"
@@ -238,9 +312,9 @@ required_apps = ["erpnext"]
 # Automatically update python controller files with type annotations for this app.
 # export_python_type_annotations = True
 
-# default_log_clearing_doctypes = {
-# 	"Logging DocType Name": 30  # days to retain logs
-# }
+default_log_clearing_doctypes = {
+    "Production Plan Run Log": 30  # days to retain logs
+}
 
 # Optional: Fixtures if you have custom fields/workspaces
 fixtures = [